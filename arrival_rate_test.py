@@ -0,0 +1,36 @@
+from locust import events
+
+from common.arrival import ConstantArrivalRateShape, POISSON, pace_arrivals
+# Locust ищет классы пользователей в модуле сценария, поэтому импорт нужен, хотя и не используется
+from stress_test import MixedBehavior  # noqa: F401
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    pace_arrivals(environment)
+
+
+class ArrivalRateShape(ConstantArrivalRateShape):
+    """
+    Форма нагрузки с постоянной частотой запросов
+
+    Аргументы:
+
+        stages -- Стадии: конец стадии в секундах от начала теста и частота запросов в секунду
+        distribution -- Интервалы между запросами: POISSON (случайные) или FIXED (равные)
+        min_users, max_users -- Границы числа пользователей, которое подбирается под частоту
+        spawn_rate -- Сколько пользователей запускать/останавливать в секунду
+    """
+
+    stages = [
+        {"duration": 60, "rate": 20},
+        {"duration": 180, "rate": 100},
+        {"duration": 240, "rate": 20}
+    ]
+    distribution = POISSON
+    min_users = 1
+    max_users = 500
+    spawn_rate = 10
+
+# Locust запускается через терминал:
+# locust -f arrival_rate_test.py
@@ -0,0 +1 @@
+# Бенчмарки генератора нагрузки
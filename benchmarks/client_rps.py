@@ -0,0 +1,68 @@
+"""
+Бенчмарк HTTP-клиентов: HttpUser против FastHttpUser
+
+Поднимает локальный сервер-заглушку (benchmarks.mock_server) и по очереди запускает
+max_perf_test.py в headless-режиме без пауз между задачами в обоих режимах.
+Выводит RPS и RPS на ядро - число запросов на секунду процессорного времени генератора.
+
+Запуск из корня репозитория:
+    python -m benchmarks.client_rps --users 20 --run-time 20
+"""
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import mock_server
+
+LOCUSTFILE = os.path.join(os.path.dirname(__file__), "scenario_locustfile.py")
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_locust(host, users, run_time, fast, directory, scenario="max_perf_test"):
+    """
+    Запускает сценарий без пауз и возвращает строку Aggregated из CSV-статистики и процессорное время генератора
+    """
+    prefix = os.path.join(directory, f"{scenario}_{'fast' if fast else 'requests'}")
+    env = dict(os.environ, LOCUST_FAST_HTTP="1" if fast else "0", BENCH_SCENARIO=scenario)
+    cpu_before = children_cpu()
+    subprocess.run(
+        [sys.executable, "-m", "locust", "-f", LOCUSTFILE, "--headless", "--only-summary",
+         "-u", str(users), "-r", str(users), "-t", f"{run_time}s", "--host", host, "--csv", prefix],
+        env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    cpu = children_cpu() - cpu_before
+
+    with open(f"{prefix}_stats.csv") as file:
+        total = next(row for row in csv.DictReader(file) if row["Name"] == "Aggregated")
+    return total, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="Количество пользователей")
+    parser.add_argument("--run-time", type=int, default=20, help="Длительность каждого прогона, секунд")
+    args = parser.parse_args()
+
+    server, host = mock_server.spawn()
+    try:
+        print(f"{'client':<10} {'requests':>10} {'RPS':>10} {'CPU, s':>8} {'RPS / core':>11}")
+        with tempfile.TemporaryDirectory() as directory:
+            for fast in (False, True):
+                total, cpu = run_locust(host, args.users, args.run_time, fast, directory)
+                count, rps = int(total["Request Count"]), float(total["Requests/s"])
+                name = "fasthttp" if fast else "requests"
+                print(f"{name:<10} {count:>10} {rps:>10.1f} {cpu:>8.1f} {count / cpu:>11.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Бенчмарк загрузки учётных данных
+
+Сравнивает старую загрузку (readlines + список кортежей + Queue) с ленивым CredentialFile.
+Каждый вариант запускается в отдельном процессе, чтобы замеры памяти не смешивались.
+Выводит время старта и прирост RSS в пересчёте на миллион строк.
+
+Запуск:
+    python -m benchmarks.credentials_loader --lines 5000000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from queue import Queue
+
+from common.credentials import CredentialFile, CredentialPool
+
+
+def load_legacy(path):
+    # Повторяет загрузку, которая раньше выполнялась при импорте сценариев
+    with open(path, "r") as file:
+        credentials = [tuple(line.strip().split(",")) for line in file.readlines()]
+    credentials_queue = Queue()
+    for cred in credentials:
+        credentials_queue.put(cred)
+    return credentials_queue
+
+
+def load_lazy(path):
+    pool = CredentialPool(CredentialFile(path))
+    pool.acquire()  # декодируем первую запись, как при старте первого пользователя
+    return pool
+
+
+LOADERS = {"legacy": load_legacy, "lazy": load_lazy}
+
+
+def max_rss_kb():
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def measure(loader, path):
+    rss_before = max_rss_kb()
+    started = time.perf_counter()
+    loaded = LOADERS[loader](path)
+    elapsed = time.perf_counter() - started
+    print(f"{elapsed} {max_rss_kb() - rss_before}")
+    return loaded
+
+
+def generate(path, lines):
+    with open(path, "w") as file:
+        for i in range(1, lines + 1):
+            file.write(f"user{i},pass{i}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Количество строк в сгенерированном файле")
+    parser.add_argument("--measure", choices=LOADERS, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "credentials.txt")
+        generate(path, args.lines)
+        millions = args.lines / 1_000_000
+
+        print(f"{'loader':<8} {'startup, s':>12} {'s / 1M':>10} {'RSS, MB':>10} {'MB / 1M':>10}")
+        for loader in LOADERS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.credentials_loader", "--measure", loader, "--path", path],
+                check=True, capture_output=True, text=True).stdout
+            elapsed, rss_kb = output.split()
+            elapsed, rss_mb = float(elapsed), int(rss_kb) / 1024
+            print(f"{loader:<8} {elapsed:>12.3f} {elapsed / millions:>10.3f} {rss_mb:>10.1f} {rss_mb / millions:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Сквозной бенчмарк генератора нагрузки на локальном сервере-заглушке
+
+Поднимает benchmarks.mock_server с заданной задержкой и по очереди запускает
+stress_test.py и max_perf_test.py в headless-режиме без пауз между задачами
+для каждого HTTP-клиента. Для каждого прогона выводит:
+
+    RPS / core -- запросов на секунду процессорного времени генератора
+    CPU -- загрузка генератора в процентах одного ядра
+    client, server -- среднее время ответа по данным Locust и по данным сервера, мс
+    overhead -- их разница: сколько добавляют к времени ответа клиент и сеть
+
+Сравнение прогонов до и после изменения в генераторе показывает, сколько оно стоит
+в запросах на ядро и в искажении времени ответа.
+
+Настройки соединений генератора (LOCUST_KEEP_ALIVE, LOCUST_TLS_RESUMPTION и другие, см. common.users)
+передаются через переменные окружения; с --certfile и --keyfile сервер работает по HTTPS.
+
+Запуск из корня репозитория:
+    python -m benchmarks.e2e --users 50 --run-time 30 --latency exp:10
+    LOCUST_KEEP_ALIVE=0 python -m benchmarks.e2e --certfile cert.pem --keyfile key.pem
+"""
+import argparse
+import json
+import ssl
+import tempfile
+from urllib.request import urlopen
+
+from benchmarks import mock_server
+from benchmarks.client_rps import run_locust
+
+SCENARIOS = ("stress_test", "max_perf_test")
+CLIENTS = {"requests": False, "fasthttp": True}
+
+
+def server_stats(host):
+    # Сертификат сервера-заглушки самоподписанный
+    with urlopen(f"{host}/__stats", context=ssl._create_unverified_context()) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="Количество пользователей")
+    parser.add_argument("--run-time", type=int, default=30, help="Длительность каждого прогона, секунд")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Сценарий, по умолчанию все")
+    parser.add_argument("--client", action="append", choices=CLIENTS, help="HTTP-клиент, по умолчанию все")
+    parser.add_argument("--latency", action="append", default=[], help="Задержка сервера, см. benchmarks.mock_server")
+    parser.add_argument("--error-rate", type=float, default=0, help="Доля ответов сервера с ошибкой")
+    parser.add_argument("--certfile", help="Сертификат сервера: запросы пойдут по HTTPS")
+    parser.add_argument("--keyfile", help="Ключ сертификата сервера")
+    args = parser.parse_args()
+
+    options = [f"--latency={spec}" for spec in args.latency] + ["--error-rate", str(args.error_rate)]
+    if args.certfile:
+        options += ["--certfile", args.certfile, "--keyfile", args.keyfile]
+    server, host = mock_server.spawn(*options)
+    if args.certfile:
+        host = host.replace("http://", "https://")
+    try:
+        print(f"{'scenario':<14} {'client':<9} {'requests':>9} {'failures':>9} {'RPS':>9} {'CPU, %':>7} "
+              f"{'RPS / core':>11} {'client, ms':>11} {'server, ms':>11} {'overhead, ms':>13}")
+        with tempfile.TemporaryDirectory() as directory:
+            for scenario in args.scenario or SCENARIOS:
+                for client in args.client or CLIENTS:
+                    before = server_stats(host)
+                    total, cpu = run_locust(host, args.users, args.run_time, CLIENTS[client], directory, scenario)
+                    after = server_stats(host)
+
+                    count = int(total["Request Count"])
+                    served = after["requests"] - before["requests"]
+                    server_ms = (after["service_time"] - before["service_time"]) / served * 1000 if served else 0
+                    client_ms = float(total["Average Response Time"])
+                    print(f"{scenario:<14} {client:<9} {count:>9} {int(total['Failure Count']):>9} "
+                          f"{float(total['Requests/s']):>9.1f} {cpu / args.run_time * 100:>7.0f} "
+                          f"{count / cpu:>11.1f} {client_ms:>11.2f} {server_ms:>11.2f} {client_ms - server_ms:>13.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Бенчмарк извлечения topicsStat[0].topicId из ответа /api/get/topics
+
+Сравнивает на ответах от 1 КБ до 10 МБ, начиная с тела ответа в байтах (response.content):
+
+    json.loads -- декодирование всего тела и полный разбор, как response.json()
+    text + JsonPath -- декодирование всего тела, как response.text, и JsonPath по строке
+    JsonPath -- JsonPath по байтам: декодируется только начало тела
+
+Запуск:
+    python -m benchmarks.json_extract
+"""
+import argparse
+import json
+import timeit
+
+from common.extract import JsonPath
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def topics_response(size):
+    # Тело ответа в формате /api/get/topics примерно заданного размера в байтах
+    topic = {"topicId": 0, "topicType": {"id": 1, "name": "Видео"}}
+    topic_size = len(json.dumps(topic, ensure_ascii=False).encode()) + 2
+    topics = [dict(topic, topicId=i) for i in range(max(size // topic_size, 1))]
+    return json.dumps({"topicsStat": topics}, ensure_ascii=False).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Сколько раз повторять замер, берётся лучший")
+    args = parser.parse_args()
+
+    path = JsonPath("topicsStat[0].topicId")
+
+    def best(function, number):
+        return min(timeit.repeat(function, number=number, repeat=args.repeat)) / number
+
+    print(f"{'size':>10} {'json.loads, us':>15} {'text + JsonPath, us':>20} {'JsonPath, us':>13} {'speedup':>8}")
+    for size in SIZES:
+        content = topics_response(size)
+        number = max(10_000_000 // size, 1)
+        assert path.extract(content) == json.loads(content.decode())["topicsStat"][0]["topicId"]
+
+        full = best(lambda: json.loads(content.decode())["topicsStat"][0]["topicId"], number)
+        text = best(lambda: path.extract(content.decode()), number)
+        partial = best(lambda: path.extract(content), number)
+        print(f"{len(content):>10} {full * 1e6:>15.1f} {text * 1e6:>20.1f} {partial * 1e6:>13.1f} "
+              f"{full / partial:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
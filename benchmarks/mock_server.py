@@ -0,0 +1,234 @@
+"""
+Локальный сервер-заглушка с эндпоинтами сценариев
+
+Отвечает на /api/login, /api/get/topics, /api/user/topic/plan, /api/logout и /YourUrl
+в тех же форматах, что и настоящий сервис. Задержки, размер ответов и доля ошибок настраиваются.
+GET /__stats возвращает число обработанных запросов и суммарное время их обработки
+в этом процессе сервера.
+
+Запуск:
+    python -m benchmarks.mock_server --port 8080 --latency exp:20 --latency /api/login=const:50 --error-rate 0.01
+    locust -f stress_test.py --host http://127.0.0.1:8080
+
+Задержка задаётся как [ПУТЬ=]РАСПРЕДЕЛЕНИЕ, где распределение:
+    const:MS, uniform:MIN_MS:MAX_MS, exp:MEAN_MS, normal:MEAN_MS:STDDEV_MS
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import ssl
+import subprocess
+import sys
+import time
+from multiprocessing import Process
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def parse_latency(spec):
+    """
+    Возвращает функцию, которая выдаёт задержку в секундах по описанию распределения
+    """
+    kind, *args = spec.split(":")
+    args = [float(arg) / 1000 for arg in args]
+    if kind == "const" and len(args) == 1:
+        return lambda: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "exp" and len(args) == 1:
+        return lambda: random.expovariate(1 / args[0]) if args[0] else 0
+    if kind == "normal" and len(args) == 2:
+        return lambda: max(random.gauss(args[0], args[1]), 0)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockServer:
+    """
+    HTTP/1.1 сервер на asyncio с keep-alive
+
+    Аргументы:
+
+        latencies -- Словарь путь -> функция задержки; ключ None - задержка по умолчанию
+        topics -- Сколько тем возвращает /api/get/topics
+        payload_size -- Размер ответа /YourUrl в байтах
+        error_rate -- Доля запросов, на которые сервер отвечает ошибкой
+        error_status -- Код ответа для внесённых ошибок
+    """
+
+    def __init__(self, latencies=None, topics=2, payload_size=128, error_rate=0, error_status=500):
+        self.latencies = latencies or {}
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+        self.requests = 0
+        self.service_time = 0
+
+        topics_stat = [{"topicId": i, "topicType": {"id": i % 2 + 1, "name": "Video" if i % 2 == 0 else "Test"}}
+                       for i in range(1, topics + 1)]
+        self.topics_body = json.dumps({"topicsStat": topics_stat}).encode()
+        self.payload_body = json.dumps({"data": "x" * max(payload_size - len('{"data": ""}'), 0)}).encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                started = time.perf_counter()
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, version = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if line:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                path = target.split("?", 1)[0]
+                status, payload = await self.respond(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+
+                if path != "/__stats":
+                    self.requests += 1
+                    self.service_time += time.perf_counter() - started
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, body):
+        if path == "/__stats":
+            return 200, json.dumps({"requests": self.requests, "service_time": self.service_time}).encode()
+
+        latency = self.latencies.get(path, self.latencies.get(None))
+        if latency is not None:
+            delay = latency()
+            if delay:
+                await asyncio.sleep(delay)
+
+        if self.error_rate and random.random() < self.error_rate:
+            error = {"error": "Injected failure", "requestId": os.urandom(8).hex(), "timestamp": time.time()}
+            return self.error_status, json.dumps(error).encode()
+
+        if path == "/api/login" and method == "POST":
+            try:
+                username = json.loads(body)["username"]
+            except (ValueError, KeyError, TypeError):
+                return 400, b'{"error": "username and password are required"}'
+            return 200, json.dumps({"accessToken": f"token-{username}-{os.urandom(4).hex()}"}).encode()
+        if path == "/api/get/topics" and method == "GET":
+            return 200, self.topics_body
+        if path == "/api/user/topic/plan" and method == "POST":
+            try:
+                topic_id = json.loads(body)["topicId"]
+            except (ValueError, KeyError, TypeError):
+                return 400, b'{"error": "topicId is required"}'
+            return 200, json.dumps({"topic_id": str(topic_id), "status": "SCHEDULED"}).encode()
+        if path == "/api/logout" and method == "DELETE":
+            return 200, b"{}"
+        if path == "/YourUrl" and method == "GET":
+            return 200, self.payload_body
+        return 404, b'{"error": "Not found"}'
+
+
+def listen(host, port):
+    # SO_REUSEPORT позволяет нескольким процессам сервера слушать один порт
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn(*options):
+    """
+    Запускает сервер в отдельном процессе на свободном порту и ждёт, пока он начнёт принимать соединения
+
+    Возвращает процесс и адрес сервера для --host.
+    """
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_server", "--port", str(port), *options])
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.terminate()
+                raise RuntimeError(f"Mock server on port {port} did not start")
+            time.sleep(0.1)
+
+
+def serve(args):
+    latencies = {}
+    for spec in args.latency:
+        path, _, distribution = spec.rpartition("=")
+        latencies[path or None] = parse_latency(distribution)
+
+    server = MockServer(latencies, args.topics, args.payload_size, args.error_rate, args.error_status)
+
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+
+    async def main():
+        async with await asyncio.start_server(server.handle, sock=listen(args.host, args.port), ssl=ssl_context) as srv:
+            await srv.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", action="append", default=[], help="Задержка [ПУТЬ=]РАСПРЕДЕЛЕНИЕ, можно несколько")
+    parser.add_argument("--topics", type=int, default=2, help="Сколько тем возвращает /api/get/topics")
+    parser.add_argument("--payload-size", type=int, default=128, help="Размер ответа /YourUrl в байтах")
+    parser.add_argument("--error-rate", type=float, default=0, help="Доля ответов с ошибкой, от 0 до 1")
+    parser.add_argument("--error-status", type=int, default=500, help="Код ответа для внесённых ошибок")
+    parser.add_argument("--processes", type=int, default=1, help="Сколько процессов сервера запустить")
+    parser.add_argument("--certfile", help="Сертификат для HTTPS")
+    parser.add_argument("--keyfile", help="Ключ сертификата для HTTPS")
+    return parser
+
+
+def main():
+    args = parser().parse_args()
+    processes = [Process(target=serve, args=(args,)) for _ in range(args.processes - 1)]
+    for process in processes:
+        process.start()
+    try:
+        serve(args)
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
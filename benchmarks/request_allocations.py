@@ -0,0 +1,74 @@
+"""
+Микробенчмарк сборки запроса UC01_01_02_your_post_example
+
+Сравнивает прежнюю сборку заголовков и тела (copy() заголовков, словарь, json.dumps)
+с заранее собранными заголовками и шаблоном тела. Выводит время сборки одного запроса
+и число новых объектов, которые каждый запрос передаёт клиенту.
+
+Запуск:
+    python -m benchmarks.request_allocations --iterations 100000
+"""
+import argparse
+import gc
+import json
+import sys
+import timeit
+
+from common.payloads import auth_headers, JsonBodyTemplate
+
+TOKEN = "eyJhbGciOiJIUzI1NiJ9.token"
+TOPIC_IDS = [1, 2, 3, 4, 5]
+
+
+def build_legacy(headers, topic_id):
+    headers = headers.copy()
+    headers["Content-Type"] = "application/json"
+    request_data = {
+        "topicId": topic_id,
+    }
+    return f"/api/user/topic/plan", headers, json.dumps(request_data)
+
+
+def build_precomputed(json_headers, topic_plan_body, topic_id):
+    return "/api/user/topic/plan", json_headers, topic_plan_body.render(topic_id)
+
+
+def blocks_per_request(build, iterations):
+    # Держим собранные запросы, чтобы посчитать объекты, которые создаются на каждый запрос
+    built = [None] * iterations
+    gc.collect()
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        for i in range(iterations):
+            built[i] = build(TOPIC_IDS[i % len(TOPIC_IDS)])
+        after = sys.getallocatedblocks()
+    finally:
+        gc.enable()
+    # Кортеж с результатом создаётся в обоих вариантах, его не учитываем
+    return (after - before) / iterations - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000, help="Количество собранных запросов")
+    args = parser.parse_args()
+
+    legacy_headers = {"Authorization": f"Bearer {TOKEN}"}
+    _, json_headers = auth_headers(TOKEN)
+    topic_plan_body = JsonBodyTemplate("topicId")
+
+    variants = {
+        "legacy": lambda topic_id: build_legacy(legacy_headers, topic_id),
+        "precomputed": lambda topic_id: build_precomputed(json_headers, topic_plan_body, topic_id),
+    }
+
+    print(f"{'variant':<12} {'ns / request':>13} {'objects / request':>18}")
+    for name, build in variants.items():
+        seconds = timeit.timeit(lambda: build(TOPIC_IDS[0]), number=args.iterations)
+        blocks = blocks_per_request(build, args.iterations)
+        print(f"{name:<12} {seconds / args.iterations * 1e9:>13.0f} {blocks:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Микробенчмарк записи запросов в SampleSink
+
+Сравнивает обработчик события request, который синхронно пишет строку CSV на каждый запрос,
+с SampleSink при разной доле записываемых запросов. Выводит время обработки одного события
+(за вычетом вызова пустого обработчика) и долю, которую оно займёт при заданном RPS на одно ядро.
+
+Запуск:
+    python -m benchmarks.sample_sink --events 500000 --rps 50000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from common.samples import read_samples, SampleSink
+
+NAMES = ["UC01_01_01 /api/get/topics", "UC01_01_02 /api/user/topic/plan", "UC01_02_01 /YourUrl"]
+
+
+class Response:
+    status_code = 200
+
+
+def fire_events(listener, events):
+    response = Response()
+    started = time.perf_counter()
+    for i in range(events):
+        listener(request_type="GET", name=NAMES[i % 3], response_time=12.5, response_length=512,
+                 response=response, context={}, exception=None, start_time=time.time(), url="/")
+    return (time.perf_counter() - started) / events
+
+
+def legacy_listener(file):
+    writer = csv.writer(file)
+
+    def on_request(request_type, name, response_time, response_length, response=None, exception=None,
+                   start_time=None, **kwargs):
+        writer.writerow([start_time, name, response_time, response_length, response.status_code, exception])
+        file.flush()
+
+    return on_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500000, help="Сколько событий request отправить")
+    parser.add_argument("--rps", type=int, default=50000, help="RPS на ядро, для которого считать долю")
+    args = parser.parse_args()
+
+    print(f"{'listener':<22} {'us / event':>11} {f'share at {args.rps} RPS':>20}")
+
+    baseline = fire_events(lambda **kwargs: None, args.events)
+
+    def report(name, seconds):
+        seconds -= baseline
+        print(f"{name:<22} {seconds * 1e6:>11.2f} {seconds * args.rps:>20.1%}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "legacy.csv"), "w", newline="") as file:
+            report("csv row per request", fire_events(legacy_listener(file), args.events))
+
+        for ratio in (1, 0.1, 0.01):
+            path = os.path.join(directory, f"samples_{ratio}.bin")
+            sink = SampleSink(path, sample_ratio=ratio)
+            sink.open(path)
+            seconds = fire_events(sink.on_request, args.events)
+            sink.close()
+            names, rows = read_samples(path)
+            assert len(rows) == sink.recorded, "samples file is incomplete"
+            report(f"SampleSink ratio={ratio}", seconds)
+
+
+if __name__ == "__main__":
+    main()
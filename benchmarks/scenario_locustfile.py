@@ -0,0 +1,12 @@
+# Сценарий из BENCH_SCENARIO (stress_test или max_perf_test) без пауз между задачами и без формы нагрузки,
+# чтобы упереться в производительность генератора при фиксированном числе пользователей (-u)
+import importlib
+import os
+
+from locust import constant
+
+scenario = importlib.import_module(os.getenv("BENCH_SCENARIO", "max_perf_test"))
+MixedBehavior = scenario.MixedBehavior
+
+scenario.YourSequentialTaskSetExample.wait_time = constant(0)
+scenario.YourRandomTaskSetExample.wait_time = constant(0)
@@ -0,0 +1 @@
+# Общие модули, которые используются сценариями нагрузочного тестирования
@@ -0,0 +1,229 @@
+import logging
+import math
+import random
+import time
+
+import gevent
+from locust import LoadTestShape
+from locust.runners import MasterRunner, WorkerRunner
+
+from common.sharding import active_workers
+
+logger = logging.getLogger(__name__)
+
+RATE_MESSAGE = "arrival_rate"
+
+POISSON = "poisson"  # экспоненциальные интервалы между запросами
+FIXED = "fixed"  # равные интервалы 1 / rate
+
+
+class ArrivalSchedule:
+    """
+    Расписание прихода запросов с заданной частотой (открытая модель нагрузки)
+
+    Каждый пользователь перед очередной задачей берёт следующий свободный слот
+    расписания и ждёт его. Если слот уже в прошлом, задача выполняется сразу и
+    считается опоздавшей; если отставание больше max_lateness, пропущенные слоты
+    считаются потерянными, и расписание догоняет текущее время.
+
+    Аргументы:
+
+        late_threshold -- Опоздание в секундах, начиная с которого запрос считается опоздавшим
+        max_lateness -- Опоздание в секундах, после которого слоты считаются потерянными
+    """
+
+    def __init__(self, late_threshold=0.05, max_lateness=1):
+        self.late_threshold = late_threshold
+        self.max_lateness = max_lateness
+        self.rate = None  # запросов в секунду на этот процесс; None - расписание выключено
+        self.distribution = POISSON
+
+        self.scheduled = 0
+        self.late = 0
+        self.dropped = 0
+
+        self._next = None
+
+    def set_rate(self, rate, distribution=POISSON):
+        if rate is not None and self.rate is None:
+            self._next = None
+        self.rate, self.distribution = rate, distribution
+
+    def next_delay(self):
+        """
+        Занимает следующий слот и возвращает, сколько секунд до него осталось
+        """
+        while not self.rate:
+            # Частота 0 - никто не должен отправлять запросы, ждём её изменения
+            gevent.sleep(0.5)
+            if self.rate is None:
+                return 0
+
+        now = time.monotonic()
+        if self._next is None:
+            self._next = now
+
+        behind = now - self._next
+        if behind > self.max_lateness:
+            # Слоты, которые уже не обслужить вовремя, теряются
+            self.dropped += int(behind * self.rate)
+            self._next = now
+            behind = 0
+
+        slot = self._next
+        self._next += random.expovariate(self.rate) if self.distribution == POISSON else 1 / self.rate
+        self.scheduled += 1
+        if behind > self.late_threshold:
+            self.late += 1
+        return max(slot - now, 0)
+
+    def counters(self):
+        return {"scheduled": self.scheduled, "late": self.late, "dropped": self.dropped}
+
+    def add(self, counters):
+        self.scheduled += counters["scheduled"]
+        self.late += counters["late"]
+        self.dropped += counters["dropped"]
+
+
+# Расписание этого процесса; включается формой ConstantArrivalRateShape
+arrival_schedule = ArrivalSchedule()
+
+
+def paced(fallback):
+    """
+    wait_time для наборов задач: по расписанию arrival_schedule, когда оно включено, иначе fallback
+
+    Аргументы:
+
+        fallback -- Обычная функция ожидания, например between(1, 5)
+    """
+
+    def wait_time(self):
+        if arrival_schedule.rate is None:
+            return fallback(self)
+        return arrival_schedule.next_delay()
+
+    return wait_time
+
+
+def pace_arrivals(environment):
+    """
+    Подключает расписание к запуску: рассылает частоту воркерам и собирает с них счётчики
+
+    Вызывается из события init в сценарии с ConstantArrivalRateShape.
+    """
+    runner = environment.runner
+
+    if isinstance(runner, WorkerRunner):
+        reported = {"scheduled": 0, "late": 0, "dropped": 0}
+
+        def on_rate(environment, msg, **kwargs):
+            if msg.data["rate"] != arrival_schedule.rate:
+                logger.info(f"Arrival rate {msg.data['rate']} requests/s")
+            arrival_schedule.set_rate(msg.data["rate"], msg.data["distribution"])
+
+        def on_report_to_master(client_id, data):
+            # Отправляем на мастер только прирост счётчиков с прошлого отчёта
+            counters = arrival_schedule.counters()
+            data[RATE_MESSAGE] = {key: counters[key] - reported[key] for key in counters}
+            reported.update(counters)
+
+        runner.register_message(RATE_MESSAGE, on_rate)
+        environment.events.report_to_master.add_listener(on_report_to_master)
+        # Воркер подключается к мастеру раньше, чем срабатывает init, и мог пропустить частоту
+        runner.send_message(RATE_MESSAGE, None)
+
+    elif isinstance(runner, MasterRunner):
+        def on_worker_report(client_id, data):
+            if RATE_MESSAGE in data:
+                arrival_schedule.add(data[RATE_MESSAGE])
+
+        def on_rate_request(environment, msg, **kwargs):
+            # Форма перешлёт частоту всем воркерам на следующем tick
+            if isinstance(environment.shape_class, ConstantArrivalRateShape):
+                environment.shape_class.resend_rate()
+
+        environment.events.worker_report.add_listener(on_worker_report)
+        runner.register_message(RATE_MESSAGE, on_rate_request)
+
+    if not isinstance(runner, WorkerRunner):
+        def on_test_stop(**kwargs):
+            counters = arrival_schedule.counters()
+            logger.info(f"Arrival schedule: {counters['scheduled']} scheduled, {counters['late']} late, "
+                        f"{counters['dropped']} dropped")
+
+        environment.events.test_stop.add_listener(on_test_stop)
+
+
+class ConstantArrivalRateShape(LoadTestShape):
+    """
+    Форма нагрузки с постоянной частотой прихода запросов
+
+    В отличие от ступенчатых форм управляет не количеством пользователей, а частотой запросов.
+    Пользователей ровно столько, чтобы при текущем времени ответа поддерживать эту частоту
+    (закон Литтла: users = rate * response_time * headroom), поэтому частота не проседает,
+    когда сервер замедляется. Пока ответов нет, запускается min_users пользователей.
+    Опоздавшие и потерянные запросы считает arrival_schedule.
+
+    Аргументы:
+
+        stages -- Список стадий {"duration": конец стадии в секундах от начала теста, "rate": запросов в секунду}
+        distribution -- Интервалы между запросами: POISSON или FIXED
+        min_users -- Минимальное число пользователей
+        max_users -- Максимальное число пользователей
+        headroom -- Запас пользователей сверх расчётного
+        spawn_rate -- Сколько пользователей запускать/останавливать в секунду
+    """
+
+    abstract = True
+
+    stages = [
+        {"duration": 60, "rate": 10},
+    ]
+    distribution = POISSON
+    min_users = 1
+    max_users = 1000
+    headroom = 2
+    spawn_rate = 10
+
+    stage = 0  # номер текущей стадии, см. common.stages
+    _sent = None
+
+    def tick(self):
+        run_time = self.get_run_time()
+
+        for self.stage, stage in enumerate(self.stages):
+            if run_time < stage["duration"]:
+                self.set_rate(stage["rate"])
+                return self.users_for(stage["rate"]), self.spawn_rate
+
+        self.set_rate(None)
+        return None
+
+    def users_for(self, rate):
+        # Медиана времени ответа за последние 10 секунд; в первые секунды теста окна ещё нет,
+        # тогда берём медиану за весь тест, а пока ответов нет совсем - min_users
+        total = self.runner.stats.total
+        response_time = total.get_current_response_time_percentile(0.5)
+        if response_time is None and total.num_requests:
+            response_time = total.median_response_time
+        if not response_time:
+            return self.min_users
+        users = math.ceil(rate * response_time / 1000 * self.headroom)
+        return min(max(users, self.min_users), self.max_users)
+
+    def set_rate(self, rate):
+        if isinstance(self.runner, MasterRunner):
+            # Частота делится поровну между воркерами и пересылается при изменении их состава:
+            # воркер, заменивший отключившийся, получает частоту, хотя их число не изменилось
+            workers = tuple(active_workers(self.runner))
+            if (rate, workers) != self._sent and workers:
+                self._sent = (rate, workers)
+                worker_rate = rate / len(workers) if rate is not None else None
+                self.runner.send_message(RATE_MESSAGE, {"rate": worker_rate, "distribution": self.distribution})
+        else:
+            arrival_schedule.set_rate(rate, self.distribution)
+
+    def resend_rate(self):
+        self._sent = None
@@ -0,0 +1,137 @@
+import logging
+import ssl
+import time
+from weakref import WeakValueDictionary
+
+from locust.runners import MasterRunner, WorkerRunner
+
+logger = logging.getLogger(__name__)
+
+HANDSHAKES_MESSAGE = "tls_handshakes"
+FULL_HANDSHAKE = "full"
+RESUMED_HANDSHAKE = "resumed"
+
+
+class HandshakeStats:
+    """
+    Счётчик TLS-рукопожатий процесса: сколько было полных и возобновлённых и сколько они заняли
+
+    Счётчики хранятся отдельно от статистики Locust, чтобы не попадать в таблицу запросов,
+    CSV и HTML-отчёт рядом с настоящими запросами. Воркеры отправляют их мастеру,
+    а сводку выводит track_connections.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = {FULL_HANDSHAKE: 0, RESUMED_HANDSHAKE: 0}
+        self.durations = {FULL_HANDSHAKE: 0.0, RESUMED_HANDSHAKE: 0.0}
+
+    def add(self, resumed, duration):
+        name = RESUMED_HANDSHAKE if resumed else FULL_HANDSHAKE
+        self.counts[name] += 1
+        self.durations[name] += duration
+
+    def take(self):
+        # Счётчики с прошлого вызова для отправки мастеру
+        taken = {"counts": self.counts, "durations": self.durations}
+        self.reset()
+        return taken
+
+    def merge(self, data):
+        for name, count in data["counts"].items():
+            self.counts[name] += count
+            self.durations[name] += data["durations"][name]
+
+    def summary(self, requests):
+        full, resumed = self.counts[FULL_HANDSHAKE], self.counts[RESUMED_HANDSHAKE]
+        average = {name: self.durations[name] / count * 1000 if count else 0 for name, count in self.counts.items()}
+        return (f"TLS handshakes: {full} full (avg {average[FULL_HANDSHAKE]:.1f} ms), "
+                f"{resumed} resumed (avg {average[RESUMED_HANDSHAKE]:.1f} ms); "
+                f"{max(requests - full - resumed, 0)} of {requests} requests reused an open connection")
+
+
+# Рукопожатия этого процесса
+handshake_stats = HandshakeStats()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    SSLContext, который считает рукопожатия и возобновляет TLS-сессии при новых соединениях к тому же хосту
+
+    Сессия берётся у последнего открытого к хосту соединения. Для TLS 1.3 билет сессии
+    приходит уже после рукопожатия, поэтому сессия запоминается не сразу, а при следующем
+    подключении - к этому моменту предыдущее соединение уже получило билет.
+    Один контекст на процесс позволяет новым пользователям возобновлять сессии тех,
+    кто остановился при смене ступени. С resume = False каждое соединение открывается
+    с полным рукопожатием, но рукопожатия всё равно считаются.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        context = super().__new__(cls, *args, **kwargs)
+        context.resume = True
+        context.sessions = {}
+        context.last_sockets = WeakValueDictionary()
+        return context
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if self.resume:
+            last = self.last_sockets.get(server_hostname)
+            if last is not None and last.session is not None:
+                self.sessions[server_hostname] = last.session
+            if session is None:
+                session = self.sessions.get(server_hostname)
+
+        started = time.perf_counter()
+        ssl_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        handshake_stats.add(ssl_sock.session_reused, time.perf_counter() - started)
+        if self.resume:
+            self.last_sockets[server_hostname] = ssl_sock
+        return ssl_sock
+
+
+def insecure_context(resume=True):
+    """
+    Контекст без проверки сертификата сервера; с resume=True - с возобновлением сессий
+    """
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.resume = resume
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def track_connections(environment):
+    """
+    Собирает счётчики рукопожатий с воркеров и выводит сводку переиспользования соединений
+
+    Вызывается из события init сценария.
+    """
+    runner = environment.runner
+
+    if isinstance(runner, WorkerRunner):
+        def on_report_to_master(client_id, data):
+            if any(handshake_stats.counts.values()):
+                data[HANDSHAKES_MESSAGE] = handshake_stats.take()
+
+        environment.events.report_to_master.add_listener(on_report_to_master)
+        return
+
+    if isinstance(runner, MasterRunner):
+        def on_worker_report(client_id, data):
+            if HANDSHAKES_MESSAGE in data:
+                handshake_stats.merge(data[HANDSHAKES_MESSAGE])
+
+        environment.events.worker_report.add_listener(on_worker_report)
+
+    def on_test_start(**kwargs):
+        handshake_stats.reset()
+
+    def on_quitting(**kwargs):
+        # Сводку выводим после последнего отчёта воркеров, который приходит при их остановке
+        if any(handshake_stats.counts.values()):
+            logger.info(handshake_stats.summary(runner.stats.total.num_requests))
+
+    environment.events.test_start.add_listener(on_test_start)
+    environment.events.quitting.add_listener(on_quitting)
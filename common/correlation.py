@@ -0,0 +1,102 @@
+import random
+import time
+from weakref import WeakKeyDictionary
+
+USER = "user"  # у каждого пользователя свои значения
+ACCOUNT = "account"  # общие для всех пользователей одного логина
+PROCESS = "process"  # общие для всего процесса генератора
+
+ROUND_ROBIN = "round_robin"  # значения выдаются по кругу
+RANDOM = "random"  # случайное значение при каждой выдаче
+
+
+class CorrelatedValues:
+    """
+    Опубликованные значения одной области видимости
+
+    Аргументы:
+
+        values -- Список значений
+        expires_at -- Момент, после которого значения нужно получить заново (time.monotonic)
+        uses -- Сколько раз значения уже выданы
+        position -- Следующее значение при выдаче по кругу
+        refresh_started -- Когда одному из пользователей поручено получить значения заново (time.monotonic)
+    """
+
+    __slots__ = ("values", "expires_at", "uses", "position", "refresh_started")
+
+    def __init__(self, values, expires_at):
+        self.values = values
+        self.expires_at = expires_at
+        self.uses = 0
+        self.position = 0
+        self.refresh_started = None
+
+
+class CorrelationStore:
+    """
+    Хранилище значений, извлечённых из ответов, для повторного использования в следующих запросах
+
+    Задача, которая получила значения (например, список ID тем), публикует их через publish(),
+    а следующие задачи берут через take() вместо повторного запроса. take() возвращает None,
+    когда значений нет, истёк ttl или они выданы refresh_every раз - тогда задача запрашивает
+    их заново и снова публикует. Устаревшие значения заново получает только один пользователь,
+    остальные до публикации (но не дольше refresh_timeout секунд) получают прежние.
+
+    Аргументы:
+
+        scope -- Область видимости: USER, ACCOUNT или PROCESS
+        ttl -- Сколько секунд значения действительны; None - без ограничения
+        refresh_every -- После скольких выдач получать значения заново; None - без ограничения
+        selection -- Порядок выдачи: ROUND_ROBIN или RANDOM
+        refresh_timeout -- Сколько секунд ждать публикации от пользователя, которому поручено обновление
+    """
+
+    def __init__(self, scope=PROCESS, ttl=60, refresh_every=None, selection=ROUND_ROBIN, refresh_timeout=10):
+        if scope not in (USER, ACCOUNT, PROCESS):
+            raise ValueError(f"Unknown scope: {scope}")
+        if selection not in (ROUND_ROBIN, RANDOM):
+            raise ValueError(f"Unknown selection: {selection}")
+        self.scope = scope
+        self.ttl = ttl
+        self.refresh_every = refresh_every
+        self.selection = selection
+        self.refresh_timeout = refresh_timeout
+        # Значения пользователя живут, пока жив его объект User
+        self._values = WeakKeyDictionary() if scope == USER else {}
+
+    def key(self, user, username):
+        """
+        Ключ области видимости для пользователя user, который работает под логином username
+        """
+        if self.scope == USER:
+            return user
+        if self.scope == ACCOUNT:
+            return username
+        return None
+
+    def take(self, key):
+        entry = self._values.get(key)
+        if entry is None or not entry.values:
+            return None
+        now = time.monotonic()
+        stale = ((entry.expires_at is not None and now >= entry.expires_at)
+                 or (self.refresh_every is not None and entry.uses >= self.refresh_every))
+        if stale and (entry.refresh_started is None or now - entry.refresh_started > self.refresh_timeout):
+            # Обновление поручаем этому вызову, остальные пока получают прежние значения
+            entry.refresh_started = now
+            return None
+
+        entry.uses += 1
+        if self.selection == RANDOM:
+            return random.choice(entry.values)
+        value = entry.values[entry.position % len(entry.values)]
+        entry.position += 1
+        return value
+
+    def publish(self, key, values):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._values[key] = CorrelatedValues(list(values), expires_at)
+
+    def invalidate(self, key):
+        self._values.pop(key, None)
@@ -0,0 +1,299 @@
+import logging
+import mmap
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+
+from gevent import getcurrent
+from locust import events
+from locust.exception import StopUser
+
+logger = logging.getLogger(__name__)
+
+# Политики поведения при исчерпании пула
+# ждать освобождения учётных данных не дольше wait_timeout секунд; одновременно работает не больше
+# пользователей, чем записей в источнике (в шарде), остальные останавливаются с ошибкой
+WAIT = "wait"
+# выдать уже занятые учётные данные повторно: несколько пользователей работают под одним логином,
+# и их сессии на сервере могут мешать друг другу
+REUSE = "reuse"
+FAIL = "fail"  # сразу остановить пользователя и записать ошибку в статистику
+
+
+class CredentialsExhausted(StopUser):
+    """
+    Свободных учётных данных не осталось
+
+    Наследуется от StopUser, поэтому пользователь, которому не хватило логина,
+    останавливается, а не зависает в on_start.
+    """
+
+
+class CredentialFile:
+    """
+    Файл с логинами и паролями, который читается лениво
+
+    Файл отображается в память через mmap, целиком не читается и не копируется.
+    Хранится только массив смещений начала строк, который дополняется по мере того,
+    как пул запрашивает следующие записи. Строка декодируется только в момент выдачи.
+    Поэтому время импорта и потребление памяти не зависят от размера файла.
+
+    Аргументы:
+
+        path -- Путь к файлу в формате "логин,пароль" по одной паре на строку
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._size = os.fstat(file.fileno()).st_size
+            # Пустой файл нельзя отобразить в память
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else b""
+        # Смещения начала строк; строка i занимает [offsets[i], offsets[i + 1] - 1)
+        self._offsets = array("Q", [0])
+        self._indexed = self._size == 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            raise IndexError("CredentialFile does not support negative indexes")
+        offsets = self._offsets
+        while len(offsets) <= index + 1 and not self._indexed:
+            self._index_next_line()
+        if len(offsets) <= index + 1:
+            raise IndexError(index)
+        line = self._data[offsets[index]:offsets[index + 1] - 1]
+        return tuple(line.decode().strip().split(","))
+
+    def _index_next_line(self):
+        start = self._offsets[-1]
+        end = self._data.find(b"\n", start)
+        if end == -1:
+            # Последняя строка без перевода строки в конце файла
+            if start < self._size:
+                self._offsets.append(self._size + 1)
+            self._indexed = True
+        else:
+            self._offsets.append(end + 1)
+            self._indexed = end + 1 == self._size
+
+
+class Lease:
+    """
+    Аренда одной пары логин-пароль
+
+    Аргументы:
+
+        index -- Номер записи в источнике
+        username -- Логин
+        password -- Пароль
+        expires_at -- Момент окончания аренды (time.monotonic), None для общей аренды
+        owner -- Гринлет, который взял учётные данные
+    """
+
+    __slots__ = ("index", "username", "password", "expires_at", "owner")
+
+    def __init__(self, index, username, password, expires_at, owner):
+        self.index = index
+        self.username = username
+        self.password = password
+        self.expires_at = expires_at
+        self.owner = owner
+
+
+class CredentialPool:
+    """
+    Пул учётных данных с ограниченной по времени арендой
+
+    Записи выдаются по порядку из источника, возвращённые записи попадают в очередь
+    свободных. Выдача и возврат выполняются за O(1).
+
+    Пул может обслуживать только часть файла (шард): записи с номерами index, index + count,
+    index + 2 * count и т.д. Так каждый воркер распределённого запуска выдаёт свои логины.
+    После смены шарда записи, которые ещё держат пользователи других воркеров, исключаются
+    из выдачи (excluded) и выдаются, когда исключение снимут.
+
+    Аренда длится lease_ttl секунд. Когда срок истекает, пул проверяет гринлет-владелец:
+    если он ещё жив, аренда продлевается, если пользователь упал или был убит без on_stop,
+    учётные данные возвращаются в пул.
+
+    Аргументы:
+
+        source -- Последовательность пар (логин, пароль), например CredentialFile;
+                  source[i] бросает IndexError за концом
+        lease_ttl -- Срок аренды в секундах
+        on_exhausted -- Политика при исчерпании пула: WAIT, REUSE или FAIL
+        wait_timeout -- Сколько секунд ждать освобождения записи при политике WAIT
+    """
+
+    def __init__(self, source, lease_ttl=600, on_exhausted=WAIT, wait_timeout=30):
+        if on_exhausted not in (WAIT, REUSE, FAIL):
+            raise ValueError(f"Unknown exhaustion policy: {on_exhausted}")
+        self.source = source
+        self.lease_ttl = lease_ttl
+        self.on_exhausted = on_exhausted
+        self.wait_timeout = wait_timeout
+
+        self.shard_index = 0
+        self.shard_count = 1
+
+        self._cursor = 0  # следующая ещё не выданная запись источника
+        self._issued = 0  # сколько записей шарда уже выдано через курсор
+        self._free = deque()  # возвращённые записи
+        self._leases = OrderedDict()  # номер записи -> Lease, в порядке истечения срока
+        self._reuse_cursor = 0
+        self._excluded = frozenset()  # записи шарда, которые держат другие воркеры
+        self._deferred = set()  # исключённые записи, которые курсор уже прошёл
+        self._pending = False  # шард сменился, а список исключённых записей ещё не получен
+        self._condition = threading.Condition()
+
+    def set_shard(self, index, count, excluded=()):
+        """
+        Ограничивает пул записями шарда index из count
+
+        Уже выданные записи остаются у пользователей до возврата; если они не попадают
+        в новый шард, то после возврата в пул не кладутся.
+
+        excluded -- Номера записей шарда, которые сейчас держат пользователи других воркеров;
+                    None - список ещё не известен: до вызова set_excluded выдаются только
+                    возвращённые записи, а новые из шарда ждут
+        """
+        with self._condition:
+            if (index, count) != (self.shard_index, self.shard_count):
+                self.shard_index, self.shard_count = index, count
+                # Курсор проходит шард заново и пропускает записи, которые сейчас в аренде
+                self._cursor = index
+                self._issued = 0
+                self._free.clear()
+                self._deferred.clear()
+                self._reuse_cursor = 0
+            if excluded is None:
+                self._pending = True
+            else:
+                self.set_excluded(excluded)
+
+    def set_excluded(self, excluded):
+        """
+        Задаёт записи шарда, которые держат пользователи других воркеров
+
+        Записи, с которых исключение снято, сразу становятся доступны для выдачи.
+        """
+        with self._condition:
+            self._excluded = frozenset(excluded)
+            self._pending = False
+            for index in [index for index in self._deferred if index not in self._excluded]:
+                self._deferred.discard(index)
+                if index not in self._leases:
+                    self._free.append(index)
+            self._condition.notify_all()
+
+    def foreign_leases(self):
+        """
+        Номера записей вне текущего шарда, которые ещё держат пользователи этого воркера
+        """
+        with self._condition:
+            return sorted(index for index in self._leases if index % self.shard_count != self.shard_index)
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._reclaim_expired(now)
+
+                taken = self._take()
+                if taken is not None:
+                    return self._lease(*taken, now)
+
+                if self._pending and now < deadline:
+                    # Ждём от мастера список записей, которые держат другие воркеры
+                    self._condition.wait(deadline - now)
+                    continue
+
+                if self.on_exhausted == REUSE and self._issued:
+                    return self._shared_lease()
+
+                if self.on_exhausted != WAIT or now >= deadline:
+                    break
+
+                # Просыпаемся либо при возврате записи, либо когда истечёт самая старая аренда
+                timeout = deadline - now
+                if self._leases:
+                    oldest = next(iter(self._leases.values()))
+                    timeout = min(timeout, max(oldest.expires_at - now, 0))
+                self._condition.wait(timeout)
+
+        exception = CredentialsExhausted(f"No free credentials (policy: {self.on_exhausted})")
+        events.request.fire(request_type="CREDENTIALS", name="exhausted",
+                            response_time=(time.monotonic() - started) * 1000, response_length=0,
+                            exception=exception, context={})
+        raise exception
+
+    def release(self, lease):
+        with self._condition:
+            # Просроченную и уже отобранную аренду повторно не возвращаем
+            if self._leases.get(lease.index) is not lease:
+                return
+            del self._leases[lease.index]
+            self._return(lease.index)
+            self._condition.notify()
+
+    def _take(self):
+        if self._free:
+            index = self._free.popleft()
+            return index, self.source[index]
+        if self._pending:
+            return None
+        while True:
+            try:
+                record = self.source[self._cursor]
+            except IndexError:
+                return None
+            index = self._cursor
+            self._cursor += self.shard_count
+            self._issued += 1
+            if index in self._excluded:
+                self._deferred.add(index)
+            elif index not in self._leases:
+                return index, record
+
+    def _return(self, index):
+        if index % self.shard_count == self.shard_index:
+            self._free.append(index)
+
+    def _lease(self, index, record, now):
+        username, password = record
+        lease = Lease(index, username, password, now + self.lease_ttl, getcurrent())
+        self._leases[index] = lease
+        return lease
+
+    def _shared_lease(self):
+        # По кругу раздаём уже выданные записи шарда; такая аренда не учитывается и не возвращается
+        if not self._reuse_cursor:
+            logger.warning(f"All {self._issued} credentials of the shard are in use, further users share accounts: "
+                           f"server-side sessions of these users may collide")
+        index = self.shard_index + self._reuse_cursor % self._issued * self.shard_count
+        self._reuse_cursor += 1
+        username, password = self.source[index]
+        return Lease(index, username, password, None, None)
+
+    def _reclaim_expired(self, now):
+        reclaimed = False
+        # Каждую аренду проверяем не больше раза: продлённая аренда с lease_ttl=0 снова просрочена
+        for _ in range(len(self._leases)):
+            lease = next(iter(self._leases.values()))
+            if lease.expires_at > now:
+                break
+            if lease.owner is not None and not lease.owner.dead:
+                # Владелец жив - продлеваем аренду и переносим её в конец очереди
+                lease.expires_at = now + self.lease_ttl
+                self._leases.move_to_end(lease.index)
+                continue
+            del self._leases[lease.index]
+            self._return(lease.index)
+            reclaimed = True
+        if reclaimed:
+            self._condition.notify_all()
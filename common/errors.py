@@ -0,0 +1,186 @@
+import logging
+import re
+from zlib import crc32
+
+from locust.runners import MasterRunner, WorkerRunner
+
+logger = logging.getLogger(__name__)
+
+ERRORS_MESSAGE = "error_samples"
+
+# Значения, которые нельзя выводить в ошибки: пароли, токены, заголовки авторизации
+SECRETS = re.compile(r'("(?:password|accessToken|refreshToken|token)"\s*:\s*)"[^"]*(?:"|$)|(Bearer\s+)[\w\-.~+/=]+',
+                     re.IGNORECASE)
+# Изменчивые части тела ответа, которые не должны влиять на отпечаток
+VOLATILE = [
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE), "<uuid>"),
+    (re.compile(r"\b[0-9a-f]{16,}\b", re.IGNORECASE), "<hex>"),
+    (re.compile(r"\d+"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def _hide_secret(match):
+    json_field, bearer = match.groups()
+    return json_field + '"***"' if json_field else bearer + "***"
+
+
+def redact(text, secrets=()):
+    text = SECRETS.sub(_hide_secret, text)
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, "***")
+    return text
+
+
+class ErrorEntry:
+    """
+    Ошибки с одним отпечатком
+
+    Аргументы:
+
+        message -- Сообщение для failure(), одинаковое на всех процессах
+        count -- Сколько раз встретилась ошибка
+        samples -- Примеры тел ответов, очищенные от секретов
+        reported_count, reported_samples -- Сколько ошибок и примеров уже отправлено мастеру
+    """
+
+    __slots__ = ("message", "count", "samples", "reported_count", "reported_samples")
+
+    def __init__(self, message):
+        self.message = message
+        self.count = 0
+        self.samples = []
+        self.reported_count = 0
+        self.reported_samples = 0
+
+
+class ErrorAggregator:
+    """
+    Ограниченная таблица ошибок с группировкой по отпечатку ответа
+
+    Вместо полного тела ответа в failure() попадает отпечаток: код ответа, хэш
+    нормализованного начала тела (числа, UUID и длинные hex-идентификаторы заменены)
+    и само нормализованное начало. Одинаковые по смыслу ответы дают одно и то же сообщение
+    на всех воркерах, поэтому таблица ошибок Locust и сообщения воркер -> мастер не растут
+    во время массовых ошибок. Исходные тела ответов хранятся как примеры и выводятся
+    только в сводке log_summary; в распределённом запуске её выводит мастер (record_errors).
+    Пароли, токены и переданные секреты вырезаются из всего, что выводится.
+
+    Аргументы:
+
+        max_entries -- Сколько разных отпечатков хранить; остальные попадают в общую запись "other"
+        max_samples -- Сколько примеров тела хранить для каждого отпечатка
+        sample_length -- До скольких символов обрезать тело ответа
+    """
+
+    def __init__(self, max_entries=100, max_samples=3, sample_length=200):
+        self.max_entries = max_entries
+        self.max_samples = max_samples
+        self.sample_length = sample_length
+        self.entries = {}
+        self.overflow = 0
+        self._reported_overflow = 0
+
+    def failure(self, response, secrets=()):
+        """
+        Отмечает запрос неуспешным с ограниченным и очищенным от секретов сообщением
+
+        secrets -- Строки, которые нужно вырезать из примеров, например пароль пользователя
+        """
+        content = response.content
+        error = getattr(response, "error", None)
+        if not content and error is not None:
+            # Ответа нет - ошибка соединения, группируем по её тексту
+            content = f"{type(error).__name__}: {error}".encode()
+        response.failure(self.register(response.status_code, content, secrets))
+
+    def register(self, status_code, content, secrets=()):
+        # Секреты вырезаем до обрезки, чтобы обрезка не оставила их начало
+        text = (content or b"")[:self.sample_length + 256].decode(errors="replace")
+        sample = redact(text, secrets)[:self.sample_length]
+        signature = sample
+        for pattern, replacement in VOLATILE:
+            signature = pattern.sub(replacement, signature)
+        fingerprint = f"{status_code}-{crc32(signature.encode()):08x}"
+
+        entry = self.entries.get(fingerprint)
+        if entry is None:
+            if len(self.entries) >= self.max_entries:
+                self.overflow += 1
+                return f"Unexpected status code: {status_code}. Response [other]"
+            entry = self.entries[fingerprint] = ErrorEntry(
+                f"Unexpected status code: {status_code}. Response [{fingerprint}]: {signature}")
+
+        entry.count += 1
+        self._add_sample(entry, sample)
+        return entry.message
+
+    def _add_sample(self, entry, sample):
+        if len(entry.samples) < self.max_samples and sample not in entry.samples:
+            entry.samples.append(sample)
+
+    def take(self):
+        """
+        Прирост ошибок и новые примеры с прошлого вызова для отправки мастеру
+        """
+        reported = []
+        for fingerprint, entry in self.entries.items():
+            if entry.count > entry.reported_count:
+                reported.append((fingerprint, entry.message, entry.count - entry.reported_count,
+                                 entry.samples[entry.reported_samples:]))
+                entry.reported_count, entry.reported_samples = entry.count, len(entry.samples)
+        overflow, self._reported_overflow = self.overflow - self._reported_overflow, self.overflow
+        return {"entries": reported, "overflow": overflow}
+
+    def merge(self, reported):
+        for fingerprint, message, count, samples in reported["entries"]:
+            entry = self.entries.get(fingerprint)
+            if entry is None:
+                if len(self.entries) >= self.max_entries:
+                    self.overflow += count
+                    continue
+                entry = self.entries[fingerprint] = ErrorEntry(message)
+            entry.count += count
+            for sample in samples:
+                self._add_sample(entry, sample)
+        self.overflow += reported["overflow"]
+
+    def log_summary(self, **kwargs):
+        if not self.entries:
+            return
+        for entry in sorted(self.entries.values(), key=lambda entry: entry.count, reverse=True):
+            logger.info(f"{entry.count} x {entry.message}")
+            for sample in entry.samples:
+                logger.info(f"    sample: {sample}")
+        if self.overflow:
+            logger.info(f"{self.overflow} errors with other fingerprints were not tracked")
+
+
+def record_errors(environment, errors):
+    """
+    Подключает ErrorAggregator к запуску: воркеры отправляют мастеру прирост ошибок и примеры,
+    а сводка с примерами выводится в конце теста там, где собрана вся статистика
+
+    Вызывается из события init сценария.
+    """
+    runner = environment.runner
+
+    if isinstance(runner, WorkerRunner):
+        def on_report_to_master(client_id, data):
+            reported = errors.take()
+            if reported["entries"] or reported["overflow"]:
+                data[ERRORS_MESSAGE] = reported
+
+        environment.events.report_to_master.add_listener(on_report_to_master)
+        return
+
+    if isinstance(runner, MasterRunner):
+        def on_worker_report(client_id, data):
+            if ERRORS_MESSAGE in data:
+                errors.merge(data[ERRORS_MESSAGE])
+
+        environment.events.worker_report.add_listener(on_worker_report)
+
+    # Сводку выводим после последнего отчёта воркеров, который приходит при их остановке
+    environment.events.quitting.add_listener(errors.log_summary)
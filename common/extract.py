@@ -0,0 +1,131 @@
+import codecs
+import re
+from json import JSONDecodeError, JSONDecoder
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+PATH = re.compile(r"(?:[^.\[\]]+|\[\d+\])(?:\.[^.\[\]]+|\[\d+\])*")
+PATH_STEP = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+_decoder = JSONDecoder()
+
+
+class PathNotFound(ValueError):
+    """
+    В ответе нет значения по пути
+
+    Наследуется от ValueError, поэтому задачи сообщают о нём тем же
+    "JSON parsing error", что и о невалидном JSON.
+    """
+
+
+class JsonPath:
+    """
+    Извлекает одно значение из JSON-ответа без разбора всего документа
+
+    Разбор идёт слева направо: соседние значения до нужного пропускаются декодером
+    из стандартной библиотеки, а всё, что лежит после найденного значения,
+    не разбирается вовсе. Тело ответа в байтах (response.content) и декодируется
+    не целиком, а с начала кусками от prefix_size байт, пока в декодированной части
+    не найдётся значение. Для пути topicsStat[0].topicId из многомегабайтного
+    ответа декодируются и разбираются только первые килобайты.
+
+    Поскольку документ после значения не читается, его ошибки не обнаруживаются:
+    из обрезанного ответа '{"topicsStat":[{"topicId":1' извлекается 1, тогда как
+    json.loads сообщает об ошибке. Если ключ в объекте повторяется, берётся первое
+    значение, а json.loads берёт последнее.
+
+    Аргументы:
+
+        path -- Путь из ключей и индексов, например "topicsStat[0].topicId"
+        prefix_size -- Сколько байт тела декодировать в первый раз; каждый следующий кусок в 4 раза больше
+    """
+
+    def __init__(self, path, prefix_size=16 * 1024):
+        if not PATH.fullmatch(path):
+            raise ValueError(f"Invalid JSON path: {path}")
+        self.path = path
+        self.steps = [int(index) if index else key for key, index in PATH_STEP.findall(path)]
+        self.prefix_size = prefix_size
+
+    def extract(self, content):
+        """
+        Возвращает значение по пути из тела ответа
+
+        content -- Тело ответа: bytes в UTF-8 или уже декодированная строка
+        """
+        if content is None:
+            raise JSONDecodeError("Empty response", "", 0)
+        if isinstance(content, str):
+            return self._extract(content)[0]
+
+        body, size = memoryview(content), self.prefix_size
+        while size < len(body):
+            # Кусок может оборвать многобайтный символ: незаконченный хвост декодер не возвращает
+            text = codecs.getincrementaldecoder("utf-8")().decode(body[:size], final=False)
+            try:
+                value, end = self._extract(text)
+            except ValueError:
+                # Значение не поместилось в кусок или ответ невалиден - проверим на большем куске
+                pass
+            else:
+                # Значение, которое кончается вместе с куском, могло быть обрезано (число 12 из 123)
+                if end < len(text):
+                    return value
+            size *= 4
+        return self._extract(codecs.decode(body, "utf-8"))[0]
+
+    def _extract(self, text):
+        position = self._skip_whitespace(text, 0)
+        for step in self.steps:
+            if isinstance(step, str):
+                position = self._find_key(text, position, step)
+            else:
+                position = self._find_index(text, position, step)
+        return _decoder.raw_decode(text, position)
+
+    def _find_key(self, text, position, key):
+        if not text.startswith("{", position):
+            raise PathNotFound(self.path)
+        position = self._skip_whitespace(text, position + 1)
+        if text.startswith("}", position):
+            raise PathNotFound(self.path)
+
+        while True:
+            if not text.startswith('"', position):
+                raise JSONDecodeError("Expecting property name enclosed in double quotes", text, position)
+            name, position = _decoder.parse_string(text, position + 1, _decoder.strict)
+            position = self._expect(text, position, ":")
+            if name == key:
+                return position
+            position = self._next_item(text, position, "}")
+
+    def _find_index(self, text, position, index):
+        if not text.startswith("[", position):
+            raise PathNotFound(self.path)
+        position = self._skip_whitespace(text, position + 1)
+        if text.startswith("]", position):
+            raise PathNotFound(self.path)
+
+        for _ in range(index):
+            position = self._next_item(text, position, "]")
+        return position
+
+    def _next_item(self, text, position, closing):
+        # Пропускаем текущее значение и переходим к следующему элементу объекта или массива
+        _, position = _decoder.raw_decode(text, position)
+        position = self._skip_whitespace(text, position)
+        if text.startswith(",", position):
+            return self._skip_whitespace(text, position + 1)
+        if text.startswith(closing, position):
+            raise PathNotFound(self.path)
+        raise JSONDecodeError("Expecting ',' delimiter", text, position)
+
+    def _expect(self, text, position, char):
+        position = self._skip_whitespace(text, position)
+        if not text.startswith(char, position):
+            raise JSONDecodeError(f"Expecting '{char}' delimiter", text, position)
+        return self._skip_whitespace(text, position + 1)
+
+    @staticmethod
+    def _skip_whitespace(text, position):
+        return WHITESPACE.match(text, position).end()
@@ -0,0 +1,212 @@
+import gc
+import logging
+import time
+
+import gevent
+from greenlet import greenlet
+from locust.runners import MasterRunner, WorkerRunner
+
+from common.stages import stage_tracker
+
+logger = logging.getLogger(__name__)
+
+MONITOR_MESSAGE = "generator_saturation"
+
+LOOP_LAG = "loop lag, ms"
+SCHEDULE_GAP = "schedule gap, ms"
+CPU = "cpu, %"
+GREENLETS = "greenlets"
+
+
+def count_greenlets():
+    # Обход всех объектов сборщика мусора: занимает десятки миллисекунд на большой куче
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, greenlet))
+
+
+class GeneratorMonitor:
+    """
+    Наблюдение за насыщением самого генератора нагрузки
+
+    Раз в interval секунд измеряет:
+
+        loop lag -- насколько позже положенного проснулся гринлет монитора, мс
+        schedule gap -- насколько позже положенного в среднем просыпались пользователи после wait_time, мс
+        cpu -- загрузка процессом одного ядра, %
+
+    и раз в greenlets_interval секунд - число всех гринлетов процесса: пользователей и служебных
+    (обновление токенов, запись сэмплов, обработчики стадий и шардов). Гринлеты считаются
+    обходом всех объектов сборщика мусора, который на это время останавливает процесс,
+    поэтому замеряются реже остальных и не входят в loop lag.
+
+    Значения не пишутся в статистику Locust, чтобы не попадать в таблицу запросов, CSV
+    и HTML-отчёт. Для каждой стадии хранятся их максимумы (peaks); воркеры отправляют их мастеру,
+    а сводка по стадиям выводится в конце теста. Замер, в котором loop lag или schedule gap
+    больше max_lag или cpu больше max_cpu, считается насыщенным. Стадия, на которой набралось
+    saturated_samples насыщенных замеров, отмечается: её времена ответа завышены генератором, а не сервером.
+
+    Аргументы:
+
+        interval -- Период замеров, секунд
+        max_lag -- Допустимое отставание цикла событий, секунд
+        max_cpu -- Допустимая загрузка ядра, %
+        saturated_samples -- Сколько насыщенных замеров отмечают стадию
+        greenlets_interval -- Период подсчёта гринлетов, секунд
+    """
+
+    def __init__(self, interval=1, max_lag=0.05, max_cpu=85, saturated_samples=3, greenlets_interval=10):
+        self.interval = interval
+        self.max_lag = max_lag
+        self.max_cpu = max_cpu
+        self.saturated_samples = saturated_samples
+        self.greenlets_interval = greenlets_interval
+
+        self.saturated = {}  # стадия -> число насыщенных замеров
+        self.peaks = {}  # стадия -> {показатель: максимум}
+        self._changed = set()  # стадии, максимумы которых ещё не отправлены мастеру
+        self._gap_total = 0
+        self._gap_count = 0
+
+    def reset(self):
+        self.saturated.clear()
+        self.peaks.clear()
+        self._changed.clear()
+        self._gap_total = self._gap_count = 0
+
+    def add_gap(self, gap):
+        self._gap_total += gap
+        self._gap_count += 1
+
+    def add_saturated(self, saturated):
+        for stage, count in saturated.items():
+            self.saturated[stage] = self.saturated.get(stage, 0) + count
+
+    def add_peaks(self, peaks):
+        for stage, values in peaks.items():
+            current = self.peaks.setdefault(stage, {})
+            for name, value in values.items():
+                if value > current.get(name, -1):
+                    current[name] = value
+                    self._changed.add(stage)
+
+    def take_peaks(self):
+        # Максимумы стадий, изменившиеся с прошлого вызова, для отправки мастеру
+        changed = {stage: dict(self.peaks[stage]) for stage in self._changed}
+        self._changed.clear()
+        return changed
+
+    def is_saturated(self, stage):
+        return self.saturated.get(stage, 0) >= self.saturated_samples
+
+    def saturated_stages(self):
+        return sorted(stage for stage in self.saturated if self.is_saturated(stage))
+
+    def run(self):
+        wall, cpu = time.monotonic(), time.process_time()
+        greenlets_at = wall
+        while True:
+            gevent.sleep(self.interval)
+            now, now_cpu = time.monotonic(), time.process_time()
+            lag = max(now - wall - self.interval, 0)
+            cpu_usage = (now_cpu - cpu) / (now - wall) * 100
+            gap = self._gap_total / self._gap_count if self._gap_count else 0
+            self._gap_total = self._gap_count = 0
+            stage = stage_tracker.stage
+
+            peaks = {LOOP_LAG: round(lag * 1000), SCHEDULE_GAP: round(gap * 1000), CPU: round(cpu_usage)}
+            if now >= greenlets_at:
+                peaks[GREENLETS] = count_greenlets()
+                greenlets_at = now + self.greenlets_interval
+            self.add_peaks({stage: peaks})
+            # Время подсчёта гринлетов не должно попасть в отставание следующего замера
+            wall, cpu = time.monotonic(), time.process_time()
+
+            if max(lag, gap) > self.max_lag or cpu_usage > self.max_cpu:
+                self.add_saturated({stage: 1})
+                if self.saturated[stage] == self.saturated_samples:
+                    logger.warning(f"Load generator is saturated at stage {stage}: loop lag {lag * 1000:.0f} ms, "
+                                   f"schedule gap {gap * 1000:.0f} ms, cpu {cpu_usage:.0f}%. "
+                                   f"Response times of this stage are inflated")
+
+
+    def summary(self):
+        lines = []
+        for stage in sorted(self.peaks):
+            values = ", ".join(f"{name} {value}" for name, value in self.peaks[stage].items())
+            lines.append(f"Load generator peaks at stage {stage}: {values}"
+                         f"{' - saturated' if self.is_saturated(stage) else ''}")
+        return lines
+
+
+# Монитор этого процесса; подключается через monitor_generator
+generator_monitor = GeneratorMonitor()
+
+
+class MonitoredSleep:
+    """
+    Примесь к наборам задач: отмечает в generator_monitor, насколько позже положенного
+    пользователь проснулся после wait_time
+
+    Ставится первой среди базовых классов: class Tasks(MonitoredSleep, TaskSet).
+    """
+
+    def _sleep(self, seconds):
+        started = time.monotonic()
+        super()._sleep(seconds)
+        generator_monitor.add_gap(max(time.monotonic() - started - seconds, 0))
+
+
+def monitor_generator(environment, monitor=generator_monitor):
+    """
+    Запускает замеры на процессах с пользователями и собирает отметки насыщения на мастере
+
+    Вызывается из события init сценария после track_stages. Формы нагрузки на мастере
+    узнают о насыщении стадии через monitor.is_saturated(stage).
+    """
+    runner = environment.runner
+    watcher = None
+
+    if isinstance(runner, WorkerRunner):
+        reported = {}
+
+        def on_report_to_master(client_id, data):
+            # Отправляем только прирост насыщенных замеров и изменившиеся максимумы с прошлого отчёта
+            delta = {stage: count - reported.get(stage, 0) for stage, count in monitor.saturated.items()
+                     if count != reported.get(stage, 0)}
+            reported.update(monitor.saturated)
+            peaks = monitor.take_peaks()
+            if delta or peaks:
+                data[MONITOR_MESSAGE] = {"saturated": delta, "peaks": peaks}
+
+        environment.events.report_to_master.add_listener(on_report_to_master)
+
+    elif isinstance(runner, MasterRunner):
+        def on_worker_report(client_id, data):
+            if MONITOR_MESSAGE in data:
+                monitor.add_saturated(data[MONITOR_MESSAGE]["saturated"])
+                monitor.add_peaks(data[MONITOR_MESSAGE]["peaks"])
+
+        environment.events.worker_report.add_listener(on_worker_report)
+
+    def on_test_start(**kwargs):
+        nonlocal watcher
+        monitor.reset()
+        if isinstance(runner, WorkerRunner):
+            reported.clear()
+        if not isinstance(runner, MasterRunner):
+            watcher = gevent.spawn(monitor.run)
+
+    def on_test_stop(**kwargs):
+        if watcher is not None:
+            watcher.kill(block=False)
+
+    def on_quitting(**kwargs):
+        # Сводку выводим после последнего отчёта воркеров, который приходит при их остановке
+        for line in monitor.summary():
+            logger.info(line)
+        if monitor.saturated_stages():
+            logger.warning(f"Load generator was saturated at stages {monitor.saturated_stages()}")
+
+    environment.events.test_start.add_listener(on_test_start)
+    environment.events.test_stop.add_listener(on_test_stop)
+    if not isinstance(runner, WorkerRunner):
+        environment.events.quitting.add_listener(on_quitting)
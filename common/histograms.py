@@ -0,0 +1,233 @@
+import csv
+import logging
+import time
+
+from locust.runners import MasterRunner, WorkerRunner
+
+from common.stages import stage_tracker
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_MESSAGE = "stage_histograms"
+
+# 2 ** (SUB_BITS - 1) корзин на каждую степень двойки: относительная погрешность значения
+# не больше 1 / 2 ** (SUB_BITS - 1), при SUB_BITS = 8 это 1/128, то есть меньше 1%
+SUB_BITS = 8
+
+
+def bucket_of(value):
+    """
+    Номер корзины для целого неотрицательного значения
+
+    Значения меньше 2 ** SUB_BITS попадают каждое в свою корзину, большие - в логарифмические
+    корзины по 2 ** (SUB_BITS - 1) на каждую степень двойки, как в HDR Histogram.
+    """
+    shift = value.bit_length() - SUB_BITS
+    if shift <= 0:
+        return value
+    return (shift << (SUB_BITS - 1)) + (value >> shift)
+
+
+def bucket_value(bucket):
+    # Наибольшее значение, которое попадает в корзину
+    if bucket < 1 << SUB_BITS:
+        return bucket
+    shift = (bucket >> (SUB_BITS - 1)) - 1
+    return ((bucket - (shift << (SUB_BITS - 1)) + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Гистограмма времени ответа в микросекундах с логарифмическими корзинами
+
+    Хранит только непустые корзины, поэтому занимает сотни байт независимо от числа запросов.
+    Гистограммы складываются без потери точности, поэтому мастер объединяет гистограммы
+    воркеров точно, а не усредняет их перцентили.
+    """
+
+    __slots__ = ("counts", "requests", "failures", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.requests = 0
+        self.failures = 0
+        self.max = 0
+
+    def record(self, response_time, failed=False):
+        value = int(response_time * 1000)
+        bucket = bucket_of(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.requests += 1
+        self.failures += failed
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.requests += other.requests
+        self.failures += other.failures
+        self.max = max(self.max, other.max)
+
+    def percentile(self, share):
+        """
+        Время ответа в мс, не больше которого share запросов
+        """
+        if not self.requests:
+            return 0
+        rank, seen = share * self.requests, 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(bucket_value(bucket), self.max) / 1000
+        return self.max / 1000
+
+    def as_dict(self):
+        return {"counts": self.counts, "requests": self.requests, "failures": self.failures, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = data["counts"]
+        histogram.requests, histogram.failures, histogram.max = data["requests"], data["failures"], data["max"]
+        return histogram
+
+
+class StageStats:
+    """
+    Таблица времени ответа по стадиям формы нагрузки и именам запросов
+
+    Каждый запрос попадает в гистограмму (стадия, имя) по текущей стадии из common.stages.
+    Воркеры отправляют мастеру накопленные гистограммы с каждым отчётом и начинают новые,
+    мастер складывает их. В конце теста выводится таблица: пользователи, RPS, p50/p95/p99/max
+    и ошибки для каждой стадии и каждого запроса.
+
+    Аргументы:
+
+        csv_path -- Куда записать таблицу в формате CSV; None - только вывести в лог
+    """
+
+    def __init__(self, csv_path=None):
+        self.csv_path = csv_path
+        self.histograms = {}  # (стадия, имя) -> LatencyHistogram
+        self.stages = {}  # стадия -> [начало, конец, пользователи]; ведётся там, где работает форма
+
+    def reset(self):
+        self.histograms.clear()
+        self.stages.clear()
+
+    def on_request(self, name, response_time, exception=None, **kwargs):
+        key = (stage_tracker.stage, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(response_time or 0, exception is not None)
+
+    def take(self):
+        # Накопленные гистограммы для отправки мастеру; дальше копим заново
+        histograms, self.histograms = self.histograms, {}
+        return [(stage, name, histogram.as_dict()) for (stage, name), histogram in histograms.items()]
+
+    def merge(self, reported):
+        for stage, name, data in reported:
+            histogram = self.histograms.get((stage, name))
+            if histogram is None:
+                histogram = self.histograms[(stage, name)] = LatencyHistogram()
+            histogram.merge(LatencyHistogram.from_dict(data))
+
+    def start_stage(self, stage, target_users, users):
+        """
+        Закрывает текущую стадию и начинает новую с целевым числом пользователей target_users
+
+        users -- Сколько пользователей работает сейчас, то есть к концу закрываемой стадии
+        """
+        self.end(users)
+        self.stages[stage] = [time.time(), None, target_users]
+
+    def end(self, users):
+        now = time.time()
+        for bounds in self.stages.values():
+            if bounds[1] is None:
+                bounds[1], bounds[2] = now, max(bounds[2], users)
+
+    def rows(self):
+        totals = {}
+        for (stage, _), histogram in self.histograms.items():
+            totals.setdefault(stage, LatencyHistogram()).merge(histogram)
+        keys = sorted(self.histograms) + [(stage, "Aggregated") for stage in totals]
+
+        for stage, name in sorted(keys, key=lambda key: (key[0], key[1] == "Aggregated", key[1])):
+            histogram = totals[stage] if name == "Aggregated" else self.histograms[(stage, name)]
+            started, ended, users = self.stages.get(stage, (None, None, None))
+            duration = ended - started if started is not None and ended is not None else None
+            yield {
+                "stage": stage,
+                "name": name,
+                "users": users,
+                "requests": histogram.requests,
+                "failures": histogram.failures,
+                "rps": round(histogram.requests / duration, 2) if duration else None,
+                "p50": histogram.percentile(0.5),
+                "p95": histogram.percentile(0.95),
+                "p99": histogram.percentile(0.99),
+                "max": histogram.max / 1000,
+            }
+
+    def log_table(self):
+        rows = list(self.rows())
+        if not rows:
+            return
+        logger.info(f"{'stage':>5} {'name':<40} {'users':>6} {'requests':>9} {'fails':>6} {'RPS':>8} "
+                    f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for row in rows:
+            rps = f"{row['rps']:.1f}" if row["rps"] is not None else "-"
+            users = row["users"] if row["users"] is not None else "-"
+            logger.info(f"{row['stage']:>5} {row['name'][:40]:<40} {users:>6} {row['requests']:>9} "
+                        f"{row['failures']:>6} {rps:>8} {row['p50']:>8.1f} {row['p95']:>8.1f} "
+                        f"{row['p99']:>8.1f} {row['max']:>8.1f}")
+        if self.csv_path:
+            with open(self.csv_path, "w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=rows[0])
+                writer.writeheader()
+                writer.writerows(rows)
+
+
+def record_stage_stats(environment, stats):
+    """
+    Подключает StageStats к запуску: запись запросов, обмен гистограммами и таблица в конце теста
+
+    Вызывается из события init сценария после track_stages.
+    """
+    runner = environment.runner
+
+    if isinstance(runner, WorkerRunner):
+        def on_report_to_master(client_id, data):
+            data[HISTOGRAM_MESSAGE] = stats.take()
+
+        environment.events.request.add_listener(stats.on_request)
+        environment.events.report_to_master.add_listener(on_report_to_master)
+        return
+
+    if isinstance(runner, MasterRunner):
+        def on_worker_report(client_id, data):
+            stats.merge(data.get(HISTOGRAM_MESSAGE, ()))
+
+        environment.events.worker_report.add_listener(on_worker_report)
+    else:
+        environment.events.request.add_listener(stats.on_request)
+
+    def on_stage(previous, stage):
+        stats.start_stage(stage, runner.target_user_count, runner.user_count)
+
+    def on_test_start(**kwargs):
+        stats.reset()
+        stats.start_stage(stage_tracker.stage, runner.target_user_count, 0)
+
+    def on_test_stop(**kwargs):
+        stats.end(0)
+        stats.log_table()
+
+    stage_tracker.add_listener(on_stage)
+    environment.events.test_start.add_listener(on_test_start)
+    # Таблицу выводим после последнего отчёта воркеров, который приходит при их остановке
+    environment.events.quitting.add_listener(on_test_stop)
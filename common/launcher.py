@@ -0,0 +1,166 @@
+"""
+Локальный распределённый запуск сценария на всех ядрах машины
+
+Запускает мастер Locust в headless-режиме и по одному воркеру на каждое доступное ядро.
+Каждый воркер закрепляется за своим ядром (os.sched_setaffinity) и получает фиксированный
+шард учётных данных через LOCUST_WORKER_INDEX и LOCUST_WORKER_COUNT (см. common.sharding).
+Мастер ни за каким ядром не закреплён: он только раздаёт пользователей и собирает статистику.
+
+Форма нагрузки из сценария работает на мастере, как при обычном распределённом запуске.
+Когда tick() возвращает None, мастер останавливает воркеров, выводит общую статистику
+и таблицу по стадиям, после чего завершается. Воркеры, которые не вышли сами за --stop-timeout
+секунд, останавливаются принудительно. Ctrl+C и SIGTERM останавливают запуск так же.
+
+Если воркер завершился раньше мастера (например, сценарий не импортировался), запуск
+останавливается так же, а не ждёт его подключения бесконечно. Мастер сам сдаётся,
+если воркеры не подключились за --expect-workers-max-wait секунд.
+
+Все аргументы, которых нет в списке ниже (-H, --csv, --html, --run-time, классы пользователей и т.д.),
+передаются мастеру без изменений. Код возврата - код возврата мастера, а если он вышел
+без ошибки после досрочного выхода воркера - 1.
+
+Запуск из корня репозитория:
+    python -m common.launcher -f max_perf_test.py -H https://example.com --csv results
+    python -m common.launcher -f stress_test.py --workers 4 -H https://example.com
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores():
+    # Ядра, на которых разрешено работать этому процессу (учитывает taskset и cgroup cpuset)
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare(core=None):
+    # Вызывается в дочернем процессе до запуска Locust. Фоновые задачи оболочки наследуют
+    # игнорирование SIGINT, а без него Locust не остановит форму нагрузки по Ctrl+C
+    def setup():
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if core is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {core})
+    return setup
+
+
+def start_master(locustfile, workers, port, max_wait, master_args):
+    command = [sys.executable, "-m", "locust", "-f", locustfile, "--master", "--headless",
+               "--master-bind-host", "127.0.0.1", "--master-bind-port", str(port),
+               "--expect-workers", str(workers), "--expect-workers-max-wait", str(max_wait), *master_args]
+    # Шарды воркерам заданы при запуске, мастер их не рассылает
+    return subprocess.Popen(command, env=dict(os.environ, LOCUST_WORKER_COUNT=str(workers)), preexec_fn=prepare())
+
+
+def start_worker(locustfile, index, count, port, core):
+    command = [sys.executable, "-m", "locust", "-f", locustfile, "--worker",
+               "--master-host", "127.0.0.1", "--master-port", str(port)]
+    env = dict(os.environ, LOCUST_WORKER_INDEX=str(index), LOCUST_WORKER_COUNT=str(count))
+    return subprocess.Popen(command, env=env, preexec_fn=prepare(core))
+
+
+def wait_master(master, workers, interval=0.5, grace=5):
+    """
+    Ждёт завершения мастера; если раньше него завершился воркер, возвращает этого воркера
+    """
+    while master.poll() is None:
+        for worker in workers:
+            if worker.poll() is not None:
+                # В конце теста воркеры выходят по команде мастера чуть раньше него самого
+                try:
+                    master.wait(grace)
+                    return None
+                except subprocess.TimeoutExpired:
+                    return worker
+        time.sleep(interval)
+    return None
+
+
+def interrupt(master, timeout):
+    # Пока работает форма нагрузки, headless-мастер корректно останавливается только по SIGINT:
+    # он останавливает воркеров, собирает их последние отчёты и выводит общую статистику
+    if master.poll() is None:
+        master.send_signal(signal.SIGINT)
+    stop([master], timeout)
+
+
+def stop(processes, timeout):
+    """
+    Ждёт завершения процессов не дольше timeout секунд, затем завершает оставшиеся
+    """
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        try:
+            process.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            pass
+    for process in processes:
+        if process.poll() is None:
+            logger.warning(f"Process {process.pid} did not exit in {timeout} s, terminating")
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-f", "--locustfile", required=True, help="Файл сценария с формой нагрузки")
+    parser.add_argument("--workers", type=int, help="Сколько воркеров запустить, по умолчанию по одному на ядро")
+    parser.add_argument("--master-port", type=int, default=0, help="Порт мастера, по умолчанию любой свободный")
+    parser.add_argument("--stop-timeout", type=float, default=30,
+                        help="Сколько секунд ждать выхода процессов после остановки мастера")
+    parser.add_argument("--expect-workers-max-wait", type=int, default=60,
+                        help="Сколько секунд мастер ждёт подключения всех воркеров")
+    args, master_args = parser.parse_known_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    cores = available_cores()
+    count = args.workers or len(cores)
+    port = args.master_port or free_port()
+    logger.info(f"Starting master and {count} workers on cores {cores}")
+
+    master = start_master(args.locustfile, count, port, args.expect_workers_max_wait, master_args)
+    workers = [start_worker(args.locustfile, index, count, port, cores[index % len(cores)])
+               for index in range(count)]
+
+    def on_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    failed, timeout = None, args.stop_timeout
+    try:
+        failed = wait_master(master, workers)
+        if failed is not None:
+            logger.error(f"Worker {failed.pid} exited with code {failed.returncode} before the master, stopping")
+            # Мастер мог не успеть начать тест и не остановить воркеров, поэтому долго их не ждём
+            timeout = min(timeout, 10)
+            interrupt(master, timeout)
+    except KeyboardInterrupt:
+        logger.info("Stopping")
+        interrupt(master, timeout)
+    finally:
+        stop(workers, timeout)
+
+    sys.exit(master.returncode or (1 if failed is not None else 0))
+
+
+if __name__ == "__main__":
+    main()
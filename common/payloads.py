@@ -0,0 +1,39 @@
+import json
+from functools import lru_cache
+from types import MappingProxyType
+
+# Заголовки без авторизации для логина
+JSON_HEADERS = MappingProxyType({"Content-Type": "application/json"})
+
+
+def auth_headers(token):
+    """
+    Возвращает неизменяемые заголовки пользователя: (только авторизация, авторизация + JSON)
+
+    Заголовки строятся один раз после логина и передаются в запросы без копирования.
+    Клиенты Locust копируют заголовки сами, поэтому общий объект не портится.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    return MappingProxyType(headers), MappingProxyType({**headers, **JSON_HEADERS})
+
+
+class JsonBodyTemplate:
+    """
+    Шаблон JSON-тела из одного поля, в котором меняется только значение
+
+    Готовые тела кэшируются по значению, поэтому для повторяющихся значений
+    не создаются ни словарь, ни строка, ни байты.
+
+    Аргументы:
+
+        field -- Имя поля, например "topicId"
+        cache_size -- Сколько различных значений держать в кэше
+    """
+
+    def __init__(self, field, cache_size=1024):
+        prefix = json.dumps({field: None})[:-len("null}")]
+        self._prefix = prefix.encode()
+        self.render = lru_cache(maxsize=cache_size)(self._render)
+
+    def _render(self, value):
+        return self._prefix + json.dumps(value).encode() + b"}"
@@ -0,0 +1,240 @@
+"""
+Запись отдельных запросов в бинарный файл для разбора после теста
+
+Выгрузка записанного файла в CSV:
+    python -m common.samples samples.bin > samples.csv
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import struct
+import sys
+from time import time
+
+import gevent
+from gevent import getcurrent
+from gevent.threadpool import ThreadPool
+from locust.runners import MasterRunner, WorkerRunner
+
+from common.stages import stage_tracker
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LOCUST-SAMPLES 1\n"
+# Поля записи одного запроса
+COLUMNS = (
+    "time",  # начало запроса, секунды от эпохи
+    "latency",  # время ответа, мс
+    "size",  # размер ответа, байт
+    "status",  # код ответа, 0 - ответа нет
+    "failed",  # 1 - запрос отмечен неуспешным
+    "name",  # номер имени запроса в таблице имён файла
+    "user",  # идентификатор гринлета пользователя, общий для всех запросов одного потока задач
+    "stage",  # номер стадии формы нагрузки, см. common.stages
+)
+ROW = struct.Struct("<dfqhBHQH")
+BLOCK_HEADER = struct.Struct("<cI")
+
+
+class SampleBatch:
+    """
+    Заранее выделенный буфер на batch_size записей ROW
+    """
+
+    __slots__ = ("count", "buffer")
+
+    def __init__(self, batch_size):
+        self.count = 0
+        self.buffer = bytearray(ROW.size * batch_size)
+
+
+class SampleSink:
+    """
+    Буфер запросов, который пишется на диск пачками в отдельном потоке
+
+    Обработчик события request только кладёт значения в заранее выделенные колонки
+    текущей пачки. Заполненная пачка уходит в очередь записи, а её место занимает
+    свободная из кольца. Запись идёт в настоящем потоке ОС, поэтому не блокирует гринлеты.
+    Если запись не успевает и свободных пачек нет, новые запросы не записываются,
+    а считаются в dropped (сам тест при этом не замедляется).
+
+    Запись одного запроса стоит около 1 мкс процессора (benchmarks/sample_sink.py): при 50 000 RPS
+    на ядро это 5-7% CPU генератора. С sample_ratio = 0.1 - около 1%.
+
+    Файл состоит из блоков: "N" - следующее имя запроса в таблице имён,
+    "B" - пачка запросов, записи ROW с полями COLUMNS подряд.
+
+    Аргументы:
+
+        path -- Файл для записи; у воркеров к имени добавляется их индекс
+        sample_ratio -- Доля записываемых запросов, от 0 до 1
+        batch_size -- Сколько запросов в одной пачке
+        batches -- Сколько пачек в кольце
+        flush_interval -- Как часто в секундах записывать неполную пачку
+    """
+
+    def __init__(self, path, sample_ratio=1, batch_size=8192, batches=8, flush_interval=1):
+        self.path = path
+        self.sample_ratio = sample_ratio
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.recorded = 0
+        self.dropped = 0
+
+        self._free = [SampleBatch(batch_size) for _ in range(batches)]
+        self._batch = None
+        self._credit = 0
+        self._names = {}
+        self._written_names = 0
+        self._file = None
+        self._writer = None
+        self._flusher = None
+
+    def open(self, path):
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._file.write(json.dumps({"columns": COLUMNS, "format": ROW.format}).encode() + b"\n")
+        self._names.clear()
+        self._written_names = 0
+        self.recorded = self.dropped = 0
+        if self._batch is None:
+            self._batch = self._free.pop()
+        self._writer = ThreadPool(1)
+        self._flusher = gevent.spawn(self._flush_periodically)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._flusher.kill(block=False)
+        self._submit()
+        self._writer.join()
+        self._writer.kill()
+        self._file.close()
+        logger.info(f"Samples: {self.recorded} recorded, {self.dropped} dropped, written to {self._file.name}")
+        self._file = None
+
+    def on_request(self, name, response_time, response_length, response=None, exception=None, start_time=None,
+                   **kwargs):
+        if self._file is None:
+            return
+        if self.sample_ratio < 1:
+            # Равномерная выборка без вызова random на каждый запрос
+            self._credit += self.sample_ratio
+            if self._credit < 1:
+                return
+            self._credit -= 1
+
+        batch = self._batch
+        if batch is None:
+            if not self._free:
+                self.dropped += 1
+                return
+            batch = self._batch = self._free.pop()
+
+        name_id = self._names.get(name)
+        if name_id is None:
+            name_id = self._names[name] = len(self._names)
+        # Одна запись одним вызовом pack_into в заранее выделенный буфер
+        ROW.pack_into(batch.buffer, batch.count * ROW.size, start_time or time(), response_time or 0,
+                      response_length or 0, getattr(response, "status_code", 0) or 0, exception is not None,
+                      name_id, id(getcurrent()), stage_tracker.stage)
+        batch.count += 1
+        self.recorded += 1
+
+        if batch.count == self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        batch, self._batch = self._batch, None
+        if batch is None or not batch.count:
+            if batch is not None:
+                self._batch = batch
+            return
+        names = list(self._names)[self._written_names:]
+        self._written_names += len(names)
+        self._writer.spawn(self._write, batch, names)
+        if self._free:
+            self._batch = self._free.pop()
+
+    def _write(self, batch, names):
+        # Выполняется в потоке записи
+        for name in names:
+            encoded = name.encode()
+            self._file.write(BLOCK_HEADER.pack(b"N", len(encoded)) + encoded)
+        self._file.write(BLOCK_HEADER.pack(b"B", batch.count))
+        self._file.write(memoryview(batch.buffer)[:batch.count * ROW.size])
+        batch.count = 0
+        self._free.append(batch)
+
+    def _flush_periodically(self):
+        while True:
+            gevent.sleep(self.flush_interval)
+            self._submit()
+
+
+def record_samples(environment, sink):
+    """
+    Подключает sink к событиям запуска: файл открывается при старте теста и закрывается при остановке
+
+    Вызывается из события init сценария. У воркеров имя файла дополняется индексом воркера,
+    например samples.worker0.bin; мастер запросов не выполняет и ничего не пишет.
+    """
+    runner = environment.runner
+    if isinstance(runner, MasterRunner):
+        return
+
+    def on_test_start(**kwargs):
+        path = sink.path
+        if isinstance(runner, WorkerRunner):
+            root, ext = os.path.splitext(path)
+            path = f"{root}.worker{runner.worker_index}{ext}"
+        sink.open(path)
+
+    def on_test_stop(**kwargs):
+        sink.close()
+
+    environment.events.request.add_listener(sink.on_request)
+    environment.events.test_start.add_listener(on_test_start)
+    environment.events.test_stop.add_listener(on_test_stop)
+    environment.events.quitting.add_listener(on_test_stop)
+
+
+def read_samples(path):
+    """
+    Читает файл SampleSink: возвращает таблицу имён и список записей-кортежей с полями COLUMNS
+    """
+    names, rows = [], []
+    with open(path, "rb") as file:
+        if file.readline() != MAGIC:
+            raise ValueError(f"{path} is not a samples file")
+        row = struct.Struct(json.loads(file.readline())["format"])
+        while True:
+            block = file.read(BLOCK_HEADER.size)
+            if len(block) < BLOCK_HEADER.size:
+                break
+            kind, size = BLOCK_HEADER.unpack(block)
+            if kind == b"N":
+                names.append(file.read(size).decode())
+            else:
+                rows.extend(row.iter_unpack(file.read(row.size * size)))
+    return names, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Файл, записанный SampleSink")
+    args = parser.parse_args()
+
+    names, rows = read_samples(args.path)
+    name_field = COLUMNS.index("name")
+    writer = csv.writer(sys.stdout)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(row[:name_field] + (names[row[name_field]],) + row[name_field + 1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import json
+import logging
+
+from locust import LoadTestShape
+from locust.stats import calculate_response_time_percentile, diff_response_time_dicts
+
+logger = logging.getLogger(__name__)
+
+# Показатели ступени считаются только по HTTP-запросам: служебные строки статистики
+# (CREDENTIALS exhausted) говорят о генераторе, а не о сервере
+HTTP_METHODS = frozenset(("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"))
+
+
+def http_totals(stats):
+    """
+    Запросы, ошибки и распределение времени ответа по всем HTTP-запросам статистики
+    """
+    requests = failures = 0
+    response_times = {}
+    for entry in stats.entries.values():
+        if entry.method not in HTTP_METHODS:
+            continue
+        requests += entry.num_requests
+        failures += entry.num_failures
+        for response_time, count in entry.response_times.items():
+            response_times[response_time] = response_times.get(response_time, 0) + count
+    return requests, failures, response_times
+
+
+class StepMeasurement:
+    """
+    Показатели одной ступени, посчитанные по приросту статистики HTTP-запросов за окно замера
+
+    Аргументы:
+
+        users -- Сколько пользователей работало к концу ступени
+        target_users -- Сколько пользователей задала форма
+        rps -- Запросов в секунду
+        failure_ratio -- Доля неуспешных запросов
+        p95, p99 -- Перцентили времени ответа, мс
+    """
+
+    def __init__(self, users, target_users, rps, failure_ratio, p95, p99):
+        self.users = users
+        self.target_users = target_users
+        self.rps = rps
+        self.failure_ratio = failure_ratio
+        self.p95 = p95
+        self.p99 = p99
+
+    @property
+    def users_limited(self):
+        return self.users < self.target_users
+
+    def as_dict(self):
+        return {"users": self.users, "target_users": self.target_users, "users_limited": self.users_limited,
+                "rps": round(self.rps, 2), "failure_ratio": round(self.failure_ratio, 4),
+                "p95": self.p95, "p99": self.p99}
+
+
+class AdaptiveStepLoadShape(LoadTestShape):
+    """
+    Ступенчатая форма нагрузки, которая ищет максимальную устойчивую нагрузку
+
+    Пока сервер справляется, каждые step_time секунд добавляет step_load пользователей.
+    Ступень считается перегруженной, если доля ошибок больше max_failure_ratio, p95 или p99
+    выросли больше чем в latency_factor раз относительно первой ступени, или RPS вырос
+    меньше чем на min_rps_gain относительно лучшей ступени (плато). После первой перегрузки
+    число пользователей подбирается делением пополам между последней устойчивой и
+    перегруженной ступенью, пока интервал не станет меньше precision. Затем тест
+    останавливается, а итог пишется в summary_path.
+
+    Показатели ступени считаются по второй части ступени (после warmup),
+    чтобы не учитывать запуск и остановку пользователей, и только по HTTP-запросам.
+    Поиск ведётся по заданному числу пользователей, а в итог пишется и число
+    реально работавших: если их меньше (например, не хватило логинов), ступень
+    показывает нагрузку, которую генератор на самом деле дал, и отмечается users_limited.
+    Если такие ступени были, итог тоже отмечается users_limited: найденный предел может
+    быть пределом генератора, а не сервера.
+
+    Если задан generator_monitor, ступени, на которых не справлялся сам генератор, отмечаются
+    в итоге. С stop_on_generator_saturation такая ступень становится верхней границей поиска,
+    то есть пользователи сверх неё не добавляются.
+
+    Аргументы:
+
+        step_time -- Время между ступенями
+        step_load -- Количество пользователей, добавляемое на каждой ступени
+        spawn_rate -- Сколько пользователей запускать/останавливать в секунду на каждой ступени
+        time_limit -- Длительность всего теста
+        warmup -- Доля ступени, которая не учитывается в замере
+        max_failure_ratio -- Допустимая доля ошибок
+        latency_factor -- Допустимый рост p95/p99 относительно первой ступени
+        min_latency -- Время ответа в мс, ниже которого рост задержек не считается перегрузкой
+        min_rps_gain -- Минимальный относительный прирост RPS, ниже которого наступило плато
+        precision -- Точность поиска в пользователях
+        summary_path -- Куда записать итог в формате JSON
+        generator_monitor -- GeneratorMonitor из common.generator или None
+        stop_on_generator_saturation -- Не добавлять пользователей сверх ступени, где генератор насыщен
+    """
+
+    abstract = True
+
+    step_time = 30
+    step_load = 10
+    spawn_rate = 10
+    time_limit = 600
+
+    warmup = 0.5
+    max_failure_ratio = 0.01
+    latency_factor = 3
+    min_latency = 100
+    min_rps_gain = 0.05
+    precision = 2
+    summary_path = "max_perf_summary.json"
+    generator_monitor = None
+    stop_on_generator_saturation = False
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset_time(self):
+        super().reset_time()
+        self.reset()
+
+    def reset(self):
+        self.users = self.step_load
+        self.step_end = self.step_time
+        self.snapshot = None
+
+        self.baseline = None  # первая ступень, от неё считается рост задержек
+        self.best = None  # лучшая устойчивая ступень
+        self.low = None  # нижняя и верхняя граница поиска после первой перегрузки
+        self.high = None
+        self.steps = []
+        self.stage = 0  # номер текущей ступени, см. common.stages
+        self.finished = False
+
+    def tick(self):
+        run_time = self.get_run_time()
+
+        if self.finished:
+            return None
+
+        if run_time > self.time_limit:
+            self.finish("time limit reached")
+            return None
+
+        if self.snapshot is None and run_time >= self.step_end - self.step_time * (1 - self.warmup):
+            self.snapshot = self.take_snapshot(run_time)
+
+        if run_time >= self.step_end:
+            self.next_step(self.measure(run_time))
+            if self.finished:
+                return None
+            self.step_end = run_time + self.step_time
+            self.snapshot = None
+
+        return self.users, self.spawn_rate
+
+    def take_snapshot(self, run_time):
+        return (run_time, *http_totals(self.runner.stats))
+
+    def measure(self, run_time):
+        started, num_requests, num_failures, response_times = self.snapshot or self.take_snapshot(run_time)
+        _, total_requests, total_failures, total_response_times = self.take_snapshot(run_time)
+
+        requests = total_requests - num_requests
+        failures = total_failures - num_failures
+        window = diff_response_time_dicts(total_response_times, response_times)
+        measured = sum(window.values())
+
+        users = self.runner.user_count
+        return StepMeasurement(
+            users=users,
+            target_users=self.users,
+            rps=requests / max(run_time - started, 1e-9),
+            failure_ratio=failures / requests if requests else 0,
+            p95=calculate_response_time_percentile(window, measured, 0.95),
+            p99=calculate_response_time_percentile(window, measured, 0.99),
+        )
+
+    def is_sustainable(self, step):
+        if step.failure_ratio > self.max_failure_ratio:
+            return False
+        if self.baseline is not None:
+            if step.p95 > max(self.baseline.p95 * self.latency_factor, self.min_latency):
+                return False
+            if step.p99 > max(self.baseline.p99 * self.latency_factor, self.min_latency):
+                return False
+        if self.best is not None and step.target_users > self.best.target_users:
+            # Пользователей стало больше, а RPS почти не вырос - плато
+            return step.rps >= self.best.rps * (1 + self.min_rps_gain)
+        return True
+
+    def next_step(self, step):
+        if step.users_limited:
+            logger.warning(f"Only {step.users} of {step.target_users} users were running at the end of the step, "
+                           f"the step shows a lower load than requested")
+        sustainable = self.is_sustainable(step)
+        generator_saturated = self.generator_monitor is not None and self.generator_monitor.is_saturated(self.stage)
+        self.steps.append(dict(step.as_dict(), sustainable=sustainable, generator_saturated=generator_saturated))
+        self.stage = len(self.steps)
+        logger.info(f"Step with {step.users} of {step.target_users} users: {step.rps:.1f} RPS, "
+                    f"p95 {step.p95} ms, p99 {step.p99} ms, failures {step.failure_ratio:.2%} - "
+                    f"{'sustainable' if sustainable else 'saturated'}"
+                    f"{' (load generator saturated)' if generator_saturated else ''}")
+        if generator_saturated and self.stop_on_generator_saturation:
+            # Показатели ступени искажены генератором: дальше ищем только ниже неё
+            sustainable = False
+
+        if self.baseline is None:
+            self.baseline = step
+
+        if sustainable:
+            if self.best is None or step.rps > self.best.rps:
+                self.best = step
+            if self.high is None:
+                self.users += self.step_load
+                return
+            self.low = step.target_users
+        else:
+            if self.high is None:
+                # Первая перегрузка: ищем между последней устойчивой ступенью и текущей
+                self.low = self.best.target_users if self.best else 0
+            self.high = step.target_users
+
+        if self.high - self.low <= self.precision:
+            self.finish("saturation point found")
+            return
+        self.users = max((self.low + self.high) // 2, 1)
+
+    def finish(self, reason):
+        self.finished = True
+        summary = {
+            "reason": reason,
+            "max_rps": round(self.best.rps, 2) if self.best else None,
+            "users_at_max_rps": self.best.users if self.best else None,
+            "target_users_at_max_rps": self.best.target_users if self.best else None,
+            "p95_at_max_rps": self.best.p95 if self.best else None,
+            "p99_at_max_rps": self.best.p99 if self.best else None,
+            "users_limited": any(step["users_limited"] for step in self.steps),
+            "steps": self.steps,
+        }
+        logger.info(f"Max sustainable load: {summary['max_rps']} RPS with {summary['users_at_max_rps']} users "
+                    f"({reason})")
+        if summary["users_limited"]:
+            logger.warning("Some steps ran fewer users than requested (not enough credentials or stopped users): "
+                           "the result may be a limit of the load generator, not of the server")
+        if self.summary_path:
+            with open(self.summary_path, "w") as file:
+                json.dump(summary, file, indent=2)
@@ -0,0 +1,155 @@
+import logging
+import os
+import time
+
+import gevent
+from locust.runners import MasterRunner, WorkerRunner, STATE_MISSING
+
+logger = logging.getLogger(__name__)
+
+SHARD_MESSAGE = "credentials_shard"
+LEASES_MESSAGE = "credentials_leases"
+
+
+def active_workers(runner):
+    # Воркеры, которые не пропали по heartbeat, в порядке индексов, выданных мастером
+    workers = [worker.id for worker in runner.clients.values() if worker.state != STATE_MISSING]
+    return sorted(workers, key=runner.get_worker_index)
+
+
+def shard_credentials(environment, pool, check_interval=1, confirm_timeout=10):
+    """
+    Делит учётные данные пула между воркерами распределённого запуска
+
+    Каждый воркер получает шард (index, count) и выдаёт только записи с номером,
+    дающим index в остатке от деления на count. Так один логин используется
+    только одним пользователем во всём кластере.
+
+    Шард назначается одним из способов:
+
+        LOCUST_WORKER_INDEX и LOCUST_WORKER_COUNT -- фиксированный шард из переменных окружения;
+                  мастеру с одним LOCUST_WORKER_COUNT шарды рассылать не нужно (см. common.launcher)
+        мастер -- рассылает воркерам шарды перед стартом и при каждом подключении или
+                  пропаже воркера, поэтому шарды перестраиваются на лету
+
+    При перестроении пользователи продолжают работать под логинами старого шарда, которые теперь
+    могут попасть в шард другого воркера. Поэтому каждый воркер сразу сообщает мастеру, какие записи
+    вне нового шарда он держит, а затем - при каждом изменении этого списка в отчётах воркера.
+    Мастер пересылает эти записи воркеру, в шард которого они попали, и тот выдаёт их только
+    после возврата. Пока ответили не все воркеры (но не дольше confirm_timeout секунд),
+    воркеры выдают только возвращённые своими пользователями записи.
+
+    В одиночном запуске пул остаётся целым.
+
+    Аргументы:
+
+        environment -- Окружение Locust из события init
+        pool -- CredentialPool, который нужно шардировать
+        check_interval -- Как часто мастер проверяет состав воркеров, в секундах
+        confirm_timeout -- Сколько секунд мастер ждёт от воркеров списки записей после перестроения
+    """
+    index, count = os.getenv("LOCUST_WORKER_INDEX"), os.getenv("LOCUST_WORKER_COUNT")
+    if count is not None:
+        if index is not None:
+            pool.set_shard(int(index), int(count))
+        return
+
+    runner = environment.runner
+
+    if isinstance(runner, WorkerRunner):
+        reported = []
+
+        def report_leases(epoch):
+            leases = pool.foreign_leases()
+            reported[:] = leases
+            runner.send_message(LEASES_MESSAGE, {"epoch": epoch, "leases": leases})
+
+        def on_shard(environment, msg, **kwargs):
+            shard, excluded = (msg.data["index"], msg.data["count"]), msg.data.get("excluded")
+            if shard != (pool.shard_index, pool.shard_count):
+                logger.info(f"Credentials shard {shard[0]} of {shard[1]}")
+            pool.set_shard(*shard, excluded)
+            if excluded is None:
+                report_leases(msg.data["epoch"])
+
+        def on_report_to_master(client_id, data):
+            # Записи старого шарда возвращаются по мере остановки пользователей
+            leases = pool.foreign_leases()
+            if leases != reported:
+                reported[:] = leases
+                data[LEASES_MESSAGE] = leases
+
+        runner.register_message(SHARD_MESSAGE, on_shard)
+        environment.events.report_to_master.add_listener(on_report_to_master)
+        # Воркер подключается к мастеру раньше, чем срабатывает init, и мог пропустить свой шард
+        runner.send_message(LEASES_MESSAGE, {"epoch": None, "leases": []})
+
+    elif isinstance(runner, MasterRunner):
+        assigned = []
+        foreign = {}  # воркер -> записи вне его шарда, которые он держит
+        waiting = set()  # воркеры, которые ещё не прислали записи после перестроения
+        excluded_sent = {}  # воркер -> последний отправленный ему список исключённых записей
+        epoch, started = 0, 0
+
+        def send_exclusions():
+            if waiting:
+                return
+            for shard_index, worker_id in enumerate(assigned):
+                excluded = sorted(index for other, leases in foreign.items() if other != worker_id
+                                  for index in leases if index % len(assigned) == shard_index)
+                if excluded_sent.get(worker_id) != excluded:
+                    excluded_sent[worker_id] = excluded
+                    runner.send_message(SHARD_MESSAGE, {"index": shard_index, "count": len(assigned),
+                                                        "excluded": excluded}, worker_id)
+
+        def assign_shards(**kwargs):
+            nonlocal epoch, started
+            workers = active_workers(runner)
+            if workers != assigned:
+                assigned[:] = workers
+                epoch, started = epoch + 1, time.monotonic()
+                for worker_id in set(foreign) - set(workers):
+                    del foreign[worker_id]
+                waiting.clear()
+                waiting.update(workers)
+                excluded_sent.clear()
+                for shard_index, worker_id in enumerate(workers):
+                    runner.send_message(SHARD_MESSAGE, {"index": shard_index, "count": len(workers),
+                                                        "epoch": epoch}, worker_id)
+            elif waiting and time.monotonic() - started > confirm_timeout:
+                logger.warning(f"{len(waiting)} workers did not report leased credentials, "
+                               f"their logins may be used twice")
+                waiting.clear()
+                send_exclusions()
+
+        def on_leases(environment, msg, **kwargs):
+            if msg.node_id not in assigned:
+                return
+            if msg.data["epoch"] is None:
+                # Воркер только что подписался на шарды: повторяем ему шард текущего перестроения
+                waiting.add(msg.node_id)
+                excluded_sent.pop(msg.node_id, None)
+                runner.send_message(SHARD_MESSAGE, {"index": assigned.index(msg.node_id), "count": len(assigned),
+                                                    "epoch": epoch}, msg.node_id)
+                return
+            if msg.data["epoch"] != epoch:
+                return
+            foreign[msg.node_id] = set(msg.data["leases"])
+            waiting.discard(msg.node_id)
+            send_exclusions()
+
+        def on_worker_report(client_id, data):
+            if LEASES_MESSAGE in data and client_id in assigned:
+                foreign[client_id] = set(data[LEASES_MESSAGE])
+                send_exclusions()
+
+        def watch_workers():
+            while True:
+                assign_shards()
+                gevent.sleep(check_interval)
+
+        runner.register_message(LEASES_MESSAGE, on_leases)
+        environment.events.worker_report.add_listener(on_worker_report)
+        # test_start срабатывает на мастере до рассылки команд на запуск пользователей
+        environment.events.test_start.add_listener(assign_shards)
+        runner.greenlet.spawn(watch_workers)
@@ -0,0 +1,85 @@
+import gevent
+from locust.runners import MasterRunner, WorkerRunner
+
+STAGE_MESSAGE = "load_stage"
+
+
+class StageTracker:
+    """
+    Номер текущей стадии формы нагрузки в этом процессе
+
+    Стадию определяет форма: у форм из common у экземпляра есть атрибут stage,
+    у остальных новой стадией считается каждое изменение результата tick().
+    Мастер рассылает номер стадии воркерам, поэтому он одинаков во всех процессах.
+    Слушатели вызываются с номерами прошлой и новой стадии.
+    """
+
+    def __init__(self):
+        self.stage = 0
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def set(self, stage):
+        if stage == self.stage:
+            return
+        previous, self.stage = self.stage, stage
+        for listener in self._listeners:
+            listener(previous, stage)
+
+
+# Стадия этого процесса; обновляется через track_stages
+stage_tracker = StageTracker()
+
+
+def track_stages(environment, check_interval=1):
+    """
+    Следит за стадией формы нагрузки и рассылает её воркерам
+
+    Вызывается один раз из события init сценария.
+    """
+    runner = environment.runner
+
+    if isinstance(runner, WorkerRunner):
+        def on_stage(environment, msg, **kwargs):
+            stage_tracker.set(msg.data["stage"])
+
+        runner.register_message(STAGE_MESSAGE, on_stage)
+        return
+
+    watcher = None
+
+    def current_stage(last_tick, stage):
+        shape = environment.shape_class
+        if shape is None:
+            return last_tick, stage
+        if getattr(shape, "stage", None) is not None:
+            return last_tick, shape.stage
+        if runner.shape_last_tick is not None and runner.shape_last_tick != last_tick:
+            return runner.shape_last_tick, stage + 1 if last_tick is not None else stage
+        return last_tick, stage
+
+    def watch():
+        last_tick, stage = None, 0
+        while True:
+            last_tick, stage = current_stage(last_tick, stage)
+            if stage != stage_tracker.stage:
+                stage_tracker.set(stage)
+                if isinstance(runner, MasterRunner):
+                    runner.send_message(STAGE_MESSAGE, {"stage": stage})
+            gevent.sleep(check_interval)
+
+    def on_test_start(**kwargs):
+        nonlocal watcher
+        stage_tracker.set(0)
+        if isinstance(runner, MasterRunner):
+            runner.send_message(STAGE_MESSAGE, {"stage": 0})
+        watcher = gevent.spawn(watch)
+
+    def on_test_stop(**kwargs):
+        if watcher is not None:
+            watcher.kill(block=False)
+
+    environment.events.test_start.add_listener(on_test_start)
+    environment.events.test_stop.add_listener(on_test_stop)
@@ -0,0 +1,240 @@
+"""
+Профиль нагрузки, заранее скомпилированный во временную шкалу
+
+Запуск без нагрузки (dry-run) печатает скомпилированную кривую пользователей:
+    python -m common.timeline files/stress_profile.yaml
+"""
+import argparse
+import csv
+import math
+from array import array
+from bisect import bisect_right
+
+from locust import LoadTestShape
+
+SEGMENT_FIELDS = ("duration", "users", "from", "to", "min", "max", "period", "spawn_rate", "times")
+# Обязательные поля сегментов по типу
+REQUIRED_FIELDS = {
+    "hold": ("duration", "users"),
+    "ramp": ("duration", "to"),
+    "spike": ("duration", "users"),
+    "sine": ("duration", "min", "max"),
+    "repeat": ("times", "segments"),
+}
+
+
+class Timeline:
+    """
+    Кусочно-постоянная кривая (пользователи, скорость запуска) от времени теста
+
+    Профиль компилируется один раз: рампы и синусоиды дискретизируются с шагом
+    resolution, повторы разворачиваются, соседние одинаковые точки одного сегмента склеиваются.
+    Для каждой точки хранится номер сегмента, к которому она относится (сегменты нумеруются
+    с нуля в порядке выполнения, повторы - каждый раз заново), это стадия теста.
+    Поиск точки по времени - бинарный, поэтому tick не зависит от длины профиля.
+
+    Сегменты профиля:
+
+        hold -- {duration, users}: держать users пользователей
+        ramp -- {duration, to, from}: линейно изменить число пользователей от from
+                (по умолчанию - текущего) до to
+        spike -- {duration, users}: поднять до users и вернуться к прежнему уровню
+        sine -- {duration, min, max, period}: синусоида между min и max, например суточная
+        repeat -- {times, segments}: повторить вложенные сегменты times раз; только в YAML,
+                  в CSV (строка на сегмент) вложенные сегменты не записать
+
+    У любого сегмента можно задать свою spawn_rate. Число пользователей в users и times должны быть
+    целыми; значения рамп и синусоид округляются до целых при дискретизации.
+    """
+
+    def __init__(self, points, end):
+        self.starts = array("d", (start for start, _, _, _ in points))
+        self.users = array("l", (users for _, users, _, _ in points))
+        self.spawn_rates = array("d", (spawn_rate for _, _, spawn_rate, _ in points))
+        self.segments = array("l", (segment for _, _, _, segment in points))
+        self.end = end
+
+    def __len__(self):
+        return len(self.starts)
+
+    def index(self, run_time):
+        # Номер точки, действующей в момент run_time, или None за пределами шкалы
+        if run_time < 0 or run_time >= self.end or not self.starts:
+            return None
+        return bisect_right(self.starts, run_time) - 1
+
+    def at(self, run_time):
+        index = self.index(run_time)
+        if index is None:
+            return None
+        return self.users[index], self.spawn_rates[index]
+
+    def points(self):
+        return zip(self.starts, self.users, self.spawn_rates, self.segments)
+
+    @classmethod
+    def compile(cls, segments, spawn_rate=10, resolution=1):
+        compiler = _Compiler(spawn_rate, resolution)
+        compiler.segments(segments)
+        return cls(compiler.points, compiler.time)
+
+    @classmethod
+    def from_stages(cls, stages):
+        """
+        Шкала из списка стадий StepLoadShape, где duration - конец стадии от начала теста
+        """
+        points, start = [], 0
+        for index, stage in enumerate(stages):
+            points.append((start, stage["users"], stage["spawn_rate"], index))
+            start = stage["duration"]
+        return cls(points, start)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает профиль из YAML ({spawn_rate, resolution, segments}) или CSV (строка на сегмент)
+        """
+        if path.endswith(".csv"):
+            with open(path, newline="") as file:
+                rows = list(csv.DictReader(file))
+            segments = [{key: _number(value) if key != "type" else value
+                         for key, value in row.items() if value not in (None, "")} for row in rows]
+            for number, segment in enumerate(segments, 1):
+                if segment.get("type") == "repeat":
+                    raise ValueError(f"Segment {number}: repeat is not supported in CSV profiles, use YAML")
+            return cls.compile(segments)
+
+        import yaml  # PyYAML нужен только для профилей в YAML
+
+        with open(path) as file:
+            profile = yaml.safe_load(file)
+        return cls.compile(profile["segments"], profile.get("spawn_rate", 10), profile.get("resolution", 1))
+
+
+class _Compiler:
+    def __init__(self, spawn_rate, resolution):
+        self.spawn_rate = spawn_rate
+        self.resolution = resolution
+        self.points = []
+        self.time = 0
+        self.current_users = 0
+        self.segment = -1  # номер выполняемого сегмента
+
+    def segments(self, segments, prefix=""):
+        # Номер вложенного сегмента записывается через точку: 2.1 - первый сегмент второго (repeat)
+        for position, segment in enumerate(segments, 1):
+            number = f"{prefix}{position}"
+            kind = segment.get("type")
+            if kind not in REQUIRED_FIELDS:
+                raise ValueError(f"Segment {number}: unknown type {kind!r}")
+            unknown = set(segment) - set(SEGMENT_FIELDS) - {"type", "segments"}
+            if unknown:
+                raise ValueError(f"Segment {number} ({kind}): unknown fields {sorted(unknown)}")
+            missing = [field for field in REQUIRED_FIELDS[kind] if field not in segment]
+            if missing:
+                raise ValueError(f"Segment {number} ({kind}): missing fields {missing}")
+
+            spawn_rate = segment.get("spawn_rate", self.spawn_rate)
+            if kind == "repeat":
+                for _ in range(_whole(segment, "times", number)):
+                    self.segments(segment["segments"], f"{number}.")
+                continue
+
+            self.segment += 1
+            if kind == "hold":
+                self.add(_whole(segment, "users", number), spawn_rate)
+                self.time += segment["duration"]
+            elif kind == "spike":
+                previous = self.current_users
+                self.add(_whole(segment, "users", number), spawn_rate)
+                self.time += segment["duration"]
+                self.add(previous, spawn_rate)
+            elif kind == "ramp":
+                start, end = segment.get("from", self.current_users), segment["to"]
+                self.curve(segment["duration"], spawn_rate, lambda share: start + (end - start) * share)
+            elif kind == "sine":
+                middle = (segment["max"] + segment["min"]) / 2
+                amplitude = (segment["max"] - segment["min"]) / 2
+                period = segment.get("period", segment["duration"])
+                self.curve(segment["duration"], spawn_rate,
+                           lambda share: middle + amplitude * math.sin(2 * math.pi * share * segment["duration"] / period))
+
+    def curve(self, duration, spawn_rate, users_at):
+        # На каждом шаге выходим на значение кривой в конце шага
+        steps = max(math.ceil(duration / self.resolution), 1)
+        step_time = duration / steps
+        for step in range(steps):
+            users = round(users_at((step + 1) / steps))
+            self.add(users, max(spawn_rate, abs(users - self.current_users) / step_time))
+            self.time += step_time
+
+    def add(self, users, spawn_rate):
+        self.current_users = users
+        # Точка в тот же момент заменяет предыдущую, одинаковые соседние точки сегмента склеиваются
+        if self.points and self.points[-1][0] == self.time:
+            self.points.pop()
+        if self.points and self.points[-1][1:] == (users, spawn_rate, self.segment):
+            return
+        self.points.append((self.time, users, spawn_rate, self.segment))
+
+
+def _whole(segment, field, number):
+    value = segment[field]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value) or value < 0:
+        raise ValueError(f"Segment {number} ({segment['type']}): {field} must be a non-negative whole number, "
+                         f"got {value!r}")
+    return int(value)
+
+
+def _number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+class TimelineShape(LoadTestShape):
+    """
+    Форма нагрузки по скомпилированной временной шкале
+
+    Аргументы:
+
+        profile_path -- Файл профиля (YAML или CSV); если не задан, используются stages
+        stages -- Стадии {"duration": конец стадии от начала теста, "users", "spawn_rate"}
+    """
+
+    abstract = True
+
+    profile_path = None
+    stages = []
+    stage = 0  # номер текущего сегмента профиля (или стадии из stages), см. common.stages
+
+    def __init__(self):
+        super().__init__()
+        self.timeline = Timeline.load(self.profile_path) if self.profile_path else Timeline.from_stages(self.stages)
+
+    def tick(self):
+        index = self.timeline.index(self.get_run_time())
+        if index is None:
+            return None
+        self.stage = self.timeline.segments[index]
+        return self.timeline.users[index], self.timeline.spawn_rates[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("profile", help="Файл профиля нагрузки, YAML или CSV")
+    parser.add_argument("--width", type=int, default=60, help="Ширина графика в символах")
+    args = parser.parse_args()
+
+    timeline = Timeline.load(args.profile)
+    max_users = max(timeline.users, default=0) or 1
+
+    print(f"{len(timeline)} points, {timeline.end:.0f} s total")
+    print(f"{'time, s':>10} {'stage':>6} {'users':>7} {'spawn_rate':>11}")
+    for start, users, spawn_rate, segment in timeline.points():
+        bar = "#" * round(users / max_users * args.width)
+        print(f"{start:>10.0f} {segment:>6} {users:>7} {spawn_rate:>11.1f}  {bar}")
+    print(f"{timeline.end:>10.0f} {'':>6} {'stop':>7}")
+
+
+if __name__ == "__main__":
+    main()
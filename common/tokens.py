@@ -0,0 +1,108 @@
+import threading
+import time
+
+
+class CachedToken:
+    """
+    Токен доступа одного логина в кэше
+
+    Аргументы:
+
+        token -- Токен доступа, None если логин не удался
+        expires_at -- Момент, после которого токен не используется (time.monotonic)
+        refresh_at -- Момент, начиная с которого токен обновляется в фоне
+        refreshing -- Событие окончания идущего фонового обновления, None если обновление не идёт
+        ready -- Событие, которое ждут остальные, пока выполняется первый логин
+    """
+
+    __slots__ = ("token", "expires_at", "refresh_at", "refreshing", "ready")
+
+    def __init__(self):
+        self.token = None
+        self.expires_at = 0
+        self.refresh_at = 0
+        self.refreshing = None
+        self.ready = threading.Event()
+
+
+class TokenCache:
+    """
+    Общий кэш токенов доступа по логину
+
+    Наборы задач одного логина, в том числе перезапущенные после смены ступени,
+    получают один и тот же токен вместо повторного логина. Когда до истечения ttl
+    остаётся refresh_ahead секунд, токен обновляется в фоне, а задачи продолжают
+    работать со старым. Если токена нет или он истёк, логинится только первый
+    запросивший, остальные ждут его результат. Если токен истёк во время фонового
+    обновления, все ждут результат этого обновления.
+
+    Аргументы:
+
+        ttl -- Сколько секунд токен считается действительным
+        refresh_ahead -- За сколько секунд до истечения начинать фоновое обновление
+        retry_interval -- Сколько секунд не повторять неудавшийся логин
+    """
+
+    def __init__(self, ttl=300, refresh_ahead=30, retry_interval=5):
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.retry_interval = retry_interval
+        self._tokens = {}
+
+    def get(self, username, password, login):
+        """
+        Возвращает токен для username, при необходимости вызывая login(username, password)
+
+        login -- Функция, которая логинится и возвращает токен или None. Логин и пароль передаются
+                 ей аргументами: фоновое обновление может закончиться после остановки набора задач,
+                 который его начал
+        """
+        cached = self._tokens.get(username)
+        if cached is not None:
+            if cached.ready is not None:
+                cached.ready.wait()
+                return cached.token
+
+            now = time.monotonic()
+            if now < cached.expires_at:
+                if now >= cached.refresh_at and cached.refreshing is None:
+                    cached.refreshing = threading.Event()
+                    threading.Thread(target=self._refresh, args=(cached, username, password, login),
+                                     daemon=True).start()
+                return cached.token
+
+            if cached.refreshing is not None:
+                # Токен истёк во время фонового обновления: ждём его вместо второго логина
+                cached.refreshing.wait()
+                return self.get(username, password, login)
+
+        cached = CachedToken()
+        self._tokens[username] = cached
+        try:
+            self._store(cached, login(username, password))
+        finally:
+            ready, cached.ready = cached.ready, None
+            ready.set()
+        return cached.token
+
+    def invalidate(self, username):
+        self._tokens.pop(username, None)
+
+    def _refresh(self, cached, username, password, login):
+        try:
+            token = login(username, password)
+            # При неудаче продолжаем пользоваться старым токеном до его истечения
+            if token is not None:
+                self._store(cached, token)
+        finally:
+            refreshing, cached.refreshing = cached.refreshing, None
+            refreshing.set()
+
+    def _store(self, cached, token):
+        now = time.monotonic()
+        cached.token = token
+        if token is None:
+            cached.expires_at = cached.refresh_at = now + self.retry_interval
+        else:
+            cached.expires_at = now + self.ttl
+            cached.refresh_at = cached.expires_at - self.refresh_ahead
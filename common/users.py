@@ -0,0 +1,148 @@
+import logging
+import os
+
+from geventhttpclient.client import HTTPClientPool
+from locust import FastHttpUser, HttpUser
+from urllib3 import PoolManager
+
+from common.connections import insecure_context
+
+logger = logging.getLogger(__name__)
+
+def _flag(name, default=""):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# Быстрый клиент на geventhttpclient включается переменной окружения LOCUST_FAST_HTTP=1
+FAST_HTTP = _flag("LOCUST_FAST_HTTP")
+
+# Настройки соединений по умолчанию, их можно переопределить в классе пользователя:
+# LOCUST_POOL_SIZE -- сколько соединений держит один пользователь
+# LOCUST_KEEP_ALIVE=0 -- закрывать соединение после каждого ответа
+# LOCUST_TLS_RESUMPTION=0 -- не возобновлять TLS-сессии, каждое соединение с полным рукопожатием
+# LOCUST_SHARED_POOL=1 -- один пул соединений на всех пользователей процесса
+# LOCUST_SHARED_POOL_SIZE -- сколько соединений держит общий пул процесса
+POOL_SIZE = int(os.getenv("LOCUST_POOL_SIZE", 10))
+KEEP_ALIVE = _flag("LOCUST_KEEP_ALIVE", "1")
+TLS_RESUMPTION = _flag("LOCUST_TLS_RESUMPTION", "1")
+SHARED_POOL = _flag("LOCUST_SHARED_POOL")
+SHARED_POOL_SIZE = int(os.getenv("LOCUST_SHARED_POOL_SIZE", 1000))
+
+# Один TLS-контекст на процесс: новые пользователи возобновляют сессии тех, кто остановился
+_contexts = {}
+# Общие пулы соединений процесса по (классу клиента, размеру, возобновлению сессий)
+_shared_pools = {}
+# Общие пулы, о нехватке соединений в которых уже предупредили
+_undersized_pools = set()
+
+
+def tls_context(resume):
+    context = _contexts.get(resume)
+    if context is None:
+        context = _contexts[resume] = insecure_context(resume)
+    return context
+
+
+def _check_shared_pool(environment, key, size):
+    # Пользователь ещё не запущен, поэтому вместе с ним пользователей на одного больше, чем user_count
+    runner = environment.runner
+    if runner is None or runner.user_count < size or key in _undersized_pools:
+        return
+    _undersized_pools.add(key)
+    logger.warning(f"{runner.user_count + 1} users share a pool of {size} connections: requests wait for "
+                   f"a free connection and the wait is counted in response time, raise LOCUST_SHARED_POOL_SIZE")
+
+
+class InsecureHttpUser(HttpUser):
+    """
+    HttpUser на python-requests без проверки сертификата сервера
+
+    verify=False задаётся один раз для сессии, а не в каждом запросе,
+    чтобы задачи одинаково работали с обоими клиентами.
+
+    Общий пул не открывает соединений сверх shared_pool_size: пользователь, которому не хватило
+    соединения, ждёт, пока другой его освободит. Это ожидание на стороне клиента входит
+    в измеренное время ответа, поэтому shared_pool_size должен быть не меньше числа
+    одновременно работающих пользователей процесса; иначе в лог пишется предупреждение.
+
+    Аргументы:
+
+        pool_size -- Сколько соединений держит пользователь без общего пула
+        keep_alive -- Держать соединения открытыми между запросами
+        tls_resumption -- Возобновлять TLS-сессии вместо полного рукопожатия
+        shared_pool -- Один пул соединений на всех пользователей процесса
+        shared_pool_size -- Сколько соединений держит общий пул процесса
+    """
+
+    abstract = True
+
+    pool_size = POOL_SIZE
+    keep_alive = KEEP_ALIVE
+    tls_resumption = TLS_RESUMPTION
+    shared_pool = SHARED_POOL
+    shared_pool_size = SHARED_POOL_SIZE
+
+    def __init__(self, environment, *args, **kwargs):
+        self.pool_manager = self.connection_pool(environment)
+        super().__init__(environment, *args, **kwargs)
+        self.client.verify = False
+        if not self.keep_alive:
+            self.client.headers["Connection"] = "close"
+
+    def connection_pool(self, environment):
+        if not self.shared_pool:
+            return PoolManager(maxsize=self.pool_size, ssl_context=tls_context(self.tls_resumption))
+        key = (HttpUser, self.shared_pool_size, self.tls_resumption)
+        if key not in _shared_pools:
+            # block=True: сверх shared_pool_size соединения не открываются и не выбрасываются, запросы ждут
+            _shared_pools[key] = PoolManager(maxsize=self.shared_pool_size, block=True,
+                                             ssl_context=tls_context(self.tls_resumption))
+        _check_shared_pool(environment, key, self.shared_pool_size)
+        return _shared_pools[key]
+
+
+class InsecureFastHttpUser(FastHttpUser):
+    """
+    FastHttpUser на geventhttpclient без проверки сертификата сервера
+
+    Держит в несколько раз больше запросов в секунду на ядро, чем HttpUser.
+    catch_response, name= и failure() работают так же.
+
+    Аргументы те же, что у InsecureHttpUser.
+    """
+
+    abstract = True
+    insecure = True
+
+    pool_size = POOL_SIZE
+    keep_alive = KEEP_ALIVE
+    tls_resumption = TLS_RESUMPTION
+    shared_pool = SHARED_POOL
+    shared_pool_size = SHARED_POOL_SIZE
+
+    def __init__(self, environment, *args, **kwargs):
+        context = tls_context(self.tls_resumption)
+        self.concurrency = self.pool_size
+        self.ssl_context_factory = lambda **kwargs: context
+        if not self.keep_alive:
+            self.default_headers = {"Connection": "close"}
+        if self.shared_pool:
+            key = (FastHttpUser, self.shared_pool_size, self.tls_resumption)
+            if key not in _shared_pools:
+                _shared_pools[key] = HTTPClientPool(
+                    concurrency=self.shared_pool_size, ssl_context_factory=self.ssl_context_factory, insecure=True,
+                    connection_timeout=self.connection_timeout, network_timeout=self.network_timeout)
+            _check_shared_pool(environment, key, self.shared_pool_size)
+            self.client_pool = _shared_pools[key]
+        super().__init__(environment, *args, **kwargs)
+
+
+def http_user_class(fast=FAST_HTTP):
+    """
+    Возвращает базовый класс пользователя для сценария
+
+    Аргументы:
+
+        fast -- True для FastHttpUser, False для HttpUser; по умолчанию берётся из LOCUST_FAST_HTTP
+    """
+    return InsecureFastHttpUser if fast else InsecureHttpUser
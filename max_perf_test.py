@@ -1,77 +1,192 @@
 import json
-import math
-from queue import Queue
+import os
 
-from locust import HttpUser, between, LoadTestShape
+from locust import between, events
 from locust import SequentialTaskSet, task
 from locust import TaskSet
 
-# Загружаем логины и пароли из файла
-with open("files/credentials.txt", "r") as file:
-    credentials = [tuple(line.strip().split(",")) for line in file.readlines()]
-
-# Создаём очередь
-credentials_queue = Queue()
-
-# Кладём каждую пару логин-пароль внутрь
-for cred in credentials:
-    credentials_queue.put(cred)
+from common.arrival import paced
+from common.connections import track_connections
+from common.correlation import CorrelationStore, ROUND_ROBIN
+from common.credentials import CredentialFile, CredentialPool, WAIT
+from common.errors import ErrorAggregator, record_errors
+from common.extract import JsonPath
+from common.generator import generator_monitor, monitor_generator, MonitoredSleep
+from common.histograms import record_stage_stats, StageStats
+from common.payloads import auth_headers, JSON_HEADERS, JsonBodyTemplate
+from common.samples import record_samples, SampleSink
+from common.saturation import AdaptiveStepLoadShape
+from common.sharding import shard_credentials
+from common.stages import track_stages
+from common.tokens import TokenCache
+from common.users import http_user_class
+
+# Адреса запросов и имена, под которыми они попадают в статистику
+LOGIN_URL, LOGIN_NAME = "/api/login", "UC01 Login"
+LOGOUT_URL, LOGOUT_NAME = "/api/logout", "UC01 Logout"
+TOPICS_URL, TOPICS_NAME = "/api/get/topics", "UC01_01_01 /api/get/topics"
+TOPIC_PLAN_URL, TOPIC_PLAN_NAME = "/api/user/topic/plan", "UC01_01_02 /api/user/topic/plan"
+YOUR_URL = "/YourUrl"
+YOUR_TASK_01_NAME, YOUR_TASK_02_NAME = "UC01_02_01 /YourUrl", "UC01_02_02 /YourUrl"
+
+# ID первой темы достаётся из ответа /api/get/topics без декодирования и разбора всего списка тем
+FIRST_TOPIC_ID = JsonPath("topicsStat[0].topicId")
+TOPICS = JsonPath("topicsStat")
+
+# Переиспользование списка тем вместо запроса /api/get/topics на каждой итерации включается
+# переменной окружения LOCUST_TOPIC_STORE с областью видимости: user, account или process.
+# Темы выдаются по кругу и запрашиваются заново через ttl секунд или после refresh_every выдач
+topic_store = (CorrelationStore(scope=os.environ["LOCUST_TOPIC_STORE"], ttl=60, refresh_every=100,
+                                selection=ROUND_ROBIN) if os.getenv("LOCUST_TOPIC_STORE") else None)
+
+# Тело запроса на планирование темы, в котором меняется только topicId
+topic_plan_body = JsonBodyTemplate("topicId")
+
+# Логины и пароли читаются из файла лениво, по мере выдачи пользователям
+credentials = CredentialFile("files/credentials.txt")
+
+# Пул учётных данных: логин выдаётся пользователю в аренду и возвращается при остановке.
+# Политика при нехватке логинов задаётся переменной окружения LOCUST_CREDENTIALS_POLICY:
+# wait (по умолчанию) -- ждать освобождения логина не дольше wait_timeout секунд, после чего пользователь
+#                        останавливается с ошибкой CREDENTIALS exhausted: число пользователей ограничено
+#                        числом строк в файле, а ступени сверх него работают с меньшим числом пользователей
+#                        и отмечаются в итоге формы (users_limited);
+# reuse -- пользователи сверх числа логинов получают уже занятые логины: ступени дают нагрузку, которую
+#          задаёт форма, но сессии пользователей одного логина на сервере могут мешать друг другу;
+# fail -- сразу останавливать пользователя с ошибкой CREDENTIALS exhausted
+credentials_pool = CredentialPool(credentials, lease_ttl=600,
+                                  on_exhausted=os.getenv("LOCUST_CREDENTIALS_POLICY", WAIT), wait_timeout=30)
+
+# Общий кэш токенов по логину включается переменной окружения LOCUST_TOKEN_CACHE=1.
+# С ним наборы задач одного логина не логинятся заново при каждом старте, а токен
+# обновляется в фоне за refresh_ahead секунд до истечения ttl
+token_cache = TokenCache(ttl=300, refresh_ahead=30) if os.getenv("LOCUST_TOKEN_CACHE") else None
+
+# Ошибки группируются по коду и отпечатку тела ответа: в статистику попадает не больше
+# max_entries разных сообщений, тела обрезаются, пароли и токены вырезаются
+errors = ErrorAggregator(max_entries=100, max_samples=3, sample_length=200)
+
+# Время ответа по стадиям формы нагрузки: в конце теста выводится таблица по каждой стадии и запросу
+# (пользователи, RPS, p50/p95/p99/max, ошибки), которая также пишется в stage_stats.csv
+stage_stats = StageStats(csv_path="stage_stats.csv")
+
+# Запись запросов (время, имя, время ответа, размер, код, пользователь, стадия) в бинарный файл
+# включается переменной окружения LOCUST_SAMPLES=путь; LOCUST_SAMPLE_RATIO задаёт долю записываемых запросов.
+# По умолчанию записывается каждый десятый запрос: запись всех стоит несколько процентов CPU генератора
+# при десятках тысяч RPS на ядро, см. benchmarks/sample_sink.py.
+# Выгрузка в CSV: python -m common.samples путь
+samples = (SampleSink(os.environ["LOCUST_SAMPLES"], float(os.getenv("LOCUST_SAMPLE_RATIO", 0.1)))
+           if os.getenv("LOCUST_SAMPLES") else None)
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    # В распределённом запуске делим логины между воркерами, чтобы один логин не использовался дважды
+    shard_credentials(environment, credentials_pool)
+    # В конце теста выводим сводку ошибок с примерами ответов, в распределённом запуске - на мастере
+    record_errors(environment, errors)
+    # Номер стадии формы нагрузки, одинаковый на мастере и воркерах
+    track_stages(environment)
+    record_stage_stats(environment, stage_stats)
+    # Замеры насыщения самого генератора: отставание цикла событий, CPU, гринлеты, опоздание после ожидания
+    monitor_generator(environment)
+    # Счётчики полных и возобновлённых TLS-рукопожатий и сводка переиспользования соединений в конце теста
+    track_connections(environment)
+    if samples is not None:
+        record_samples(environment, samples)
 
 
 # Пример последовательного набора задач
-class YourSequentialTaskSetExample(SequentialTaskSet):
-    wait_time = between(1, 5)  # время ожидания между задачами
+class YourSequentialTaskSetExample(MonitoredSleep, SequentialTaskSet):
+    # время ожидания между задачами; под формой с постоянной частотой запросов - по её расписанию
+    wait_time = paced(between(1, 5))
 
     topic_id = None  # ID темы, который будет задан в UC01_01_01_your_get_example
 
     token = None
-    headers = None
+    headers = None  # заголовки с авторизацией
+    json_headers = None  # заголовки с авторизацией и Content-Type: application/json
 
+    lease = None
     password = None
     username = None
 
     # Метод, который вызывается при старте теста для каждого пользователя
     def on_start(self):
-        if self.username is None:
-            self.username, self.password = credentials_queue.get()  # получаем учетные данные из очереди
-
-        # Определяем заголовки и данные для POST-запроса
-        headers = {"Content-Type": "application/json"}
+        if self.lease is None:
+            self.lease = credentials_pool.acquire()  # берём учетные данные из пула в аренду
+            self.username, self.password = self.lease.username, self.lease.password
+
+        if token_cache is None:
+            self.set_token(self.login(self.username, self.password))
+        else:
+            self.authorize()
+
+    # Логин под учетными данными username и password, возвращает токен доступа или None
+    def login(self, username, password):
+        # Определяем данные для POST-запроса
         request_data = {
-            "username": self.username,
-            "password": self.password
+            "username": username,
+            "password": password
         }
 
         # Отправляем POST-запрос на авторизацию и обрабатываем ответ
-        with self.client.post("/api/login", data=json.dumps(request_data), headers=headers, verify=False,
-                              catch_response=True, name="UC01 Login") as response:
-            # Если статус ответа равен 200, извлекаем токен доступа и сохраняем его
+        with self.client.post(LOGIN_URL, data=json.dumps(request_data), headers=JSON_HEADERS,
+                              catch_response=True, name=LOGIN_NAME) as response:
+            # Если статус ответа равен 200, извлекаем токен доступа
             if response.status_code == 200:
                 data = response.json()
-                self.token = data.get("accessToken")  # сохраняем токен доступа
-                self.headers = {"Authorization": f"Bearer {self.token}"}
+                return data.get("accessToken")
             # Если статус ответа не равен 200, сообщаем о неожиданном статусе
-            else:
-                response.failure(
-                    f"Unexpected status code: {response.status_code}. Request payload: {request_data}. Response: {response.text}")
+            errors.failure(response, secrets=(password,))
+        return None
+
+    # Возвращает актуальный токен; с общим кэшем токен мог обновиться в фоне
+    def authorize(self):
+        if token_cache is not None and self.username is not None:
+            token = token_cache.get(self.username, self.password, self.login)
+            if token != self.token:
+                self.set_token(token)
+        return self.token
+
+    def set_token(self, token):
+        self.token = token  # сохраняем токен доступа
+        # Заголовки собираются один раз на токен и дальше передаются в запросы без копирования
+        self.headers, self.json_headers = auth_headers(token) if token else (None, None)
 
     # Задача на получение темы
     @task
     def UC01_01_01_your_get_example(self):
-        if self.token:
+        if self.authorize():
+            if topic_store is not None:
+                # Берём тему из ранее полученного списка; запрос нужен, только если список устарел
+                self.topic_id = topic_store.take(topic_store.key(self.user, self.username))
+                if self.topic_id is not None:
+                    return
+
             self.topic_id = None
-            headers = self.headers.copy()
-            with self.client.get(
-                    f"/api/get/topics", headers=headers, verify=False, catch_response=True,
-                    name="UC01_01_01 /api/get/topics") as response:
+            with self.client.get(TOPICS_URL, headers=self.headers, catch_response=True,
+                                 name=TOPICS_NAME) as response:
                 if response.status_code == 200:
                     try:
-                        data = response.json()
-                        self.topic_id = data["topicsStat"][0]["topicId"]  # получаем ID первой темы
-                    except ValueError:
+                        if topic_store is None:
+                            self.topic_id = FIRST_TOPIC_ID.extract(response.content)  # получаем ID первой темы
+                        else:
+                            self.topic_id = self.publish_topics(response.content)
+                    except (ValueError, KeyError, TypeError):
                         response.failure("JSON parsing error")
                 else:
-                    response.failure(f"Unexpected status code: {response.status_code}. Response: {response.text}")
+                    errors.failure(response)
+
+    # Публикует ID всех тем из ответа в хранилище и возвращает первую выданную тему.
+    # Пустой список тем - ошибка ответа, как и при разборе без хранилища
+    def publish_topics(self, content):
+        topic_ids = [topic["topicId"] for topic in TOPICS.extract(content)]
+        if not topic_ids:
+            raise ValueError("No topics in response")
+        key = topic_store.key(self.user, self.username)
+        topic_store.publish(key, topic_ids)
+        return topic_store.take(key)
 
     """
     Показываю пример ответа на запрос, который отправили выше, чтобы было понятно, как его парсили:
@@ -95,15 +210,14 @@ class YourSequentialTaskSetExample(SequentialTaskSet):
     # Задача на отправку пост-запроса
     @task
     def UC01_01_02_your_post_example(self):
-        if self.token:
-            headers = self.headers.copy()
-            headers["Content-Type"] = "application/json"
-            request_data = {
-                "topicId": self.topic_id,  # используем ID темы, полученный в UC01_01_01_your_get_example
-            }
-            with self.client.post(f"/api/user/topic/plan", data=json.dumps(request_data), headers=headers,
-                                  verify=False, catch_response=True,
-                                  name="UC01_01_02 /api/user/topic/plan") as response:
+        if self.topic_id is None:
+            # Тему получить не удалось, ошибка уже отмечена в UC01_01_01_your_get_example
+            return
+        if self.authorize():
+            # используем ID темы, полученный в UC01_01_01_your_get_example
+            request_data = topic_plan_body.render(self.topic_id)
+            with self.client.post(TOPIC_PLAN_URL, data=request_data, headers=self.json_headers,
+                                  catch_response=True, name=TOPIC_PLAN_NAME) as response:
                 if response.status_code == 200:
                     try:
                         data = response.json()
@@ -113,7 +227,7 @@ class YourSequentialTaskSetExample(SequentialTaskSet):
                     except ValueError:
                         response.failure("JSON parsing error")
                 else:
-                    response.failure(f"Unexpected status code: {response.status_code}. Response: {response.text}")
+                    errors.failure(response)
 
     """
     Ответ на запрос выше
@@ -125,82 +239,109 @@ class YourSequentialTaskSetExample(SequentialTaskSet):
 
     # Метод, который вызывается при завершении теста для каждого пользователя
     def on_stop(self):
-        if self.token:
-            headers = {"Authorization": f'Bearer {self.token}'}
-            with self.client.delete("/api/logout", headers=headers, verify=False,
-                                    catch_response=True, name="UC01 Logout") as response:
-                if response.status_code == 200:
-                    self.token = None  # удаляем токен доступа
-                    self.headers = None
-                    if self.username and self.password:
-                        credentials_queue.put((self.username, self.password))  # возвращаем учетные данные в очередь
-                        self.username, self.password = None, None
+        try:
+            # Токен из общего кэша не отзываем: им пользуются другие наборы задач этого логина
+            if self.token and token_cache is None:
+                with self.client.delete(LOGOUT_URL, headers=self.headers,
+                                        catch_response=True, name=LOGOUT_NAME) as response:
+                    if response.status_code == 200:
+                        self.set_token(None)  # удаляем токен доступа
+        finally:
+            # Возвращаем учетные данные в пул независимо от результата выхода
+            if self.lease is not None:
+                credentials_pool.release(self.lease)
+                self.lease = None
+                self.username, self.password = None, None
 
 
 # Пример случайного набора задач
-class YourRandomTaskSetExample(TaskSet):
-    wait_time = between(1, 5)  # время ожидания между задачами
+class YourRandomTaskSetExample(MonitoredSleep, TaskSet):
+    # время ожидания между задачами; под формой с постоянной частотой запросов - по её расписанию
+    wait_time = paced(between(1, 5))
 
     token = None
-    headers = None
+    headers = None  # заголовки с авторизацией
+    json_headers = None  # заголовки с авторизацией и Content-Type: application/json
 
+    lease = None
     password = None
     username = None
 
     def on_start(self):
-        if self.username is None:
-            self.username, self.password = credentials_queue.get()  # получаем учетные данные из очереди
+        if self.lease is None:
+            self.lease = credentials_pool.acquire()  # берём учетные данные из пула в аренду
+            self.username, self.password = self.lease.username, self.lease.password
 
-        headers = {"Content-Type": "application/json"}
+        if token_cache is None:
+            self.set_token(self.login(self.username, self.password))
+        else:
+            self.authorize()
+
+    def login(self, username, password):
         request_data = {
-            "username": self.username,
-            "password": self.password
+            "username": username,
+            "password": password
         }
-        with self.client.post("/api/login", data=json.dumps(request_data), headers=headers, verify=False,
-                              catch_response=True, name="UC01 Login") as response:
+        with self.client.post(LOGIN_URL, data=json.dumps(request_data), headers=JSON_HEADERS,
+                              catch_response=True, name=LOGIN_NAME) as response:
             if response.status_code == 200:
                 data = response.json()
-                self.token = data.get("accessToken")  # сохраняем токен доступа
-                self.headers = {"Authorization": f"Bearer {self.token}"}
-            else:
-                response.failure(
-                    f"Unexpected status code: {response.status_code}. Request payload: {request_data}. Response: {response.text}")
+                return data.get("accessToken")
+            errors.failure(response, secrets=(password,))
+        return None
+
+    def authorize(self):
+        if token_cache is not None and self.username is not None:
+            token = token_cache.get(self.username, self.password, self.login)
+            if token != self.token:
+                self.set_token(token)
+        return self.token
+
+    def set_token(self, token):
+        self.token = token  # сохраняем токен доступа
+        # Заголовки собираются один раз на токен и дальше передаются в запросы без копирования
+        self.headers, self.json_headers = auth_headers(token) if token else (None, None)
 
     # Задачи с различными весами
     @task(10)
     def UC01_02_01_your_task(self):
-        if self.token:
-            headers = self.headers.copy()
-            with self.client.get(f"/YourUrl", headers=headers, verify=False, catch_response=True,
-                                 name="UC01_02_01 /YourUrl") as response:
+        if self.authorize():
+            with self.client.get(YOUR_URL, headers=self.headers, catch_response=True,
+                                 name=YOUR_TASK_01_NAME) as response:
                 if response.status_code != 200:
-                    response.failure(f"Unexpected status code: {response.status_code}. Response: {response.text}")
+                    errors.failure(response)
 
     @task(20)
     def UC01_02_02_your_task(self):
-        if self.token:
-            headers = self.headers.copy()
-            with self.client.get(f"/YourUrl", headers=headers, verify=False, catch_response=True,
-                                 name="UC01_02_02 /YourUrl") as response:
+        if self.authorize():
+            with self.client.get(YOUR_URL, headers=self.headers, catch_response=True,
+                                 name=YOUR_TASK_02_NAME) as response:
                 if response.status_code != 200:
-                    response.failure(f"Unexpected status code: {response.status_code}. Response: {response.text}")
+                    errors.failure(response)
 
     def on_stop(self):
-        if self.token:
-            headers = {"Authorization": f'Bearer {self.token}'}
-            with self.client.delete("/api/logout", headers=headers, verify=False,
-                                    catch_response=True, name="UC01 Logout") as response:
-                if response.status_code == 200:
-                    self.token = None  # удаляем токен доступа
-                    self.headers = None
-                    if self.username and self.password:
-                        credentials_queue.put((self.username, self.password))  # возвращаем учетные данные в очередь
-                        self.username, self.password = None, None
-
-
-class StepLoadShape(LoadTestShape):
+        try:
+            # Токен из общего кэша не отзываем: им пользуются другие наборы задач этого логина
+            if self.token and token_cache is None:
+                with self.client.delete(LOGOUT_URL, headers=self.headers,
+                                        catch_response=True, name=LOGOUT_NAME) as response:
+                    if response.status_code == 200:
+                        self.set_token(None)  # удаляем токен доступа
+        finally:
+            # Возвращаем учетные данные в пул независимо от результата выхода
+            if self.lease is not None:
+                credentials_pool.release(self.lease)
+                self.lease = None
+                self.username, self.password = None, None
+
+
+class StepLoadShape(AdaptiveStepLoadShape):
     """
-    Форма ступенчатой нагрузки
+    Форма ступенчатой нагрузки с поиском максимальной производительности
+
+    Добавляет step_load пользователей на каждой ступени, пока сервер справляется.
+    После первой перегрузки подбирает наибольшее устойчивое число пользователей
+    делением пополам, останавливает тест и пишет итог в summary_path.
 
     Аргументы:
 
@@ -208,6 +349,11 @@ class StepLoadShape(LoadTestShape):
         step_load -- Количество пользователей, увеличивающееся на каждой ступени
         spawn_rate -- Сколько пользователей запускать/останавливать в секунду на каждой ступени
         time_limit -- Длительность всего теста
+        max_failure_ratio -- Допустимая доля ошибок
+        latency_factor -- Допустимый рост p95/p99 относительно первой ступени
+        min_rps_gain -- Прирост RPS между ступенями, ниже которого считаем, что наступило плато
+        summary_path -- Файл с итогом: максимальный RPS и число пользователей, на котором он достигнут
+        stop_on_generator_saturation -- Не добавлять пользователей сверх ступени, на которой не справился генератор
 
 
     """
@@ -217,18 +363,17 @@ class StepLoadShape(LoadTestShape):
     spawn_rate = 10
     time_limit = 600
 
-    def tick(self):
-        run_time = self.get_run_time()
-
-        if run_time > self.time_limit:
-            return None
-
-        current_step = math.floor(run_time / self.step_time) + 1
-        return current_step * self.step_load, self.spawn_rate
+    max_failure_ratio = 0.01
+    latency_factor = 3
+    min_rps_gain = 0.05
+    summary_path = "max_perf_summary.json"
+    generator_monitor = generator_monitor
+    stop_on_generator_saturation = True
 
 
-# Смешанное поведение пользователя
-class MixedBehavior(HttpUser):
+# Смешанное поведение пользователя.
+# По умолчанию работает на HttpUser, с LOCUST_FAST_HTTP=1 - на более производительном FastHttpUser
+class MixedBehavior(http_user_class()):
     host = "https://localhost"  # хост
 
     # Пропорции задач
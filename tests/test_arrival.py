@@ -0,0 +1,134 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from common import arrival
+from common.arrival import FIXED, POISSON, ArrivalSchedule, ConstantArrivalRateShape
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Total:
+    def __init__(self, current=None, median=0, num_requests=0):
+        self.current = current
+        self.median_response_time = median
+        self.num_requests = num_requests
+
+    def get_current_response_time_percentile(self, percent):
+        return self.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(arrival, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    # Форма в локальном запуске включает глобальное расписание процесса
+    schedule = ArrivalSchedule()
+    monkeypatch.setattr(arrival, "arrival_schedule", schedule)
+    return schedule
+
+
+def make_shape(total, **attributes):
+    shape = type("Shape", (ConstantArrivalRateShape,), attributes)()
+    shape.runner = SimpleNamespace(stats=SimpleNamespace(total=total))
+    return shape
+
+
+def test_fixed_slots_are_evenly_spaced(clock):
+    schedule = ArrivalSchedule()
+    schedule.set_rate(10, FIXED)
+
+    delays = [schedule.next_delay() for _ in range(5)]
+    assert delays == pytest.approx([0, 0.1, 0.2, 0.3, 0.4])
+    assert schedule.counters() == {"scheduled": 5, "late": 0, "dropped": 0}
+
+
+def test_poisson_slots_average_to_rate(clock):
+    random.seed(1)
+    schedule = ArrivalSchedule()
+    schedule.set_rate(10, POISSON)
+
+    delays = [schedule.next_delay() for _ in range(2000)]
+    gaps = [b - a for a, b in zip(delays, delays[1:])]
+    assert len(set(gaps)) > 1
+    assert sum(gaps) / len(gaps) == pytest.approx(0.1, rel=0.1)
+
+
+def test_late_and_dropped_slots_are_counted(clock):
+    schedule = ArrivalSchedule(late_threshold=0.05, max_lateness=1)
+    schedule.set_rate(4, FIXED)
+    schedule.next_delay()
+
+    # Следующий слот в 100.25, опоздание 0.25 с: запрос уходит сразу и считается опоздавшим
+    clock.now += 0.5
+    assert schedule.next_delay() == 0
+    assert schedule.counters() == {"scheduled": 2, "late": 1, "dropped": 0}
+
+    # Отставание 3 с больше max_lateness: 12 слотов потеряны, расписание догоняет время
+    clock.now += 3
+    assert schedule.next_delay() == 0
+    assert schedule.counters() == {"scheduled": 3, "late": 1, "dropped": 12}
+    assert schedule.next_delay() == 0.25
+
+
+def test_schedule_restarts_when_rate_is_enabled_again(clock):
+    schedule = ArrivalSchedule()
+    schedule.set_rate(10, FIXED)
+    schedule.next_delay()
+    schedule.set_rate(None)
+
+    clock.now += 60
+    schedule.set_rate(10, FIXED)
+    assert schedule.next_delay() == 0
+    assert schedule.counters()["dropped"] == 0
+
+
+def test_users_follow_rate_and_median_response_time(schedule):
+    # 50 запросов/с при медиане 200 мс и запасе 2: ceil(50 * 0.2 * 2) = 20
+    shape = make_shape(Total(current=200, num_requests=100), stages=[{"duration": 60, "rate": 50}])
+    shape.get_run_time = lambda: 10
+    assert shape.tick() == (20, shape.spawn_rate)
+    assert (schedule.rate, schedule.distribution) == (50, POISSON)
+
+    shape.runner.stats.total.current = 205
+    assert shape.users_for(50) == 21
+
+
+def test_users_are_clamped_to_min_and_max(schedule):
+    shape = make_shape(Total(current=1, num_requests=100), min_users=5, max_users=30)
+    assert shape.users_for(10) == 5
+
+    shape.runner.stats.total.current = 10000
+    assert shape.users_for(10) == 30
+
+
+def test_min_users_until_responses_arrive(schedule):
+    shape = make_shape(Total(), min_users=3)
+    assert shape.users_for(100) == 3
+
+    # Окна за последние секунды ещё нет, но ответы уже есть: берётся медиана за весь тест
+    shape.runner.stats.total = Total(median=100, num_requests=10)
+    assert shape.users_for(100) == 20
+
+
+def test_shape_stops_after_last_stage(schedule):
+    shape = make_shape(Total(), stages=[{"duration": 10, "rate": 5}, {"duration": 20, "rate": 50}])
+    shape.get_run_time = lambda: 15
+    shape.tick()
+    assert (shape.stage, schedule.rate) == (1, 50)
+
+    shape.get_run_time = lambda: 20
+    assert shape.tick() is None
+    assert schedule.rate is None
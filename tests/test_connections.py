@@ -0,0 +1,15 @@
+from common.connections import HandshakeStats
+
+
+def test_worker_counters_are_merged_on_master():
+    master, worker = HandshakeStats(), HandshakeStats()
+    worker.add(resumed=False, duration=0.004)
+    worker.add(resumed=True, duration=0.001)
+    master.merge(worker.take())
+    worker.add(resumed=True, duration=0.003)
+    master.merge(worker.take())
+
+    assert worker.counts == {"full": 0, "resumed": 0}
+    assert master.counts == {"full": 1, "resumed": 2}
+    assert master.summary(10) == ("TLS handshakes: 1 full (avg 4.0 ms), 2 resumed (avg 2.0 ms); "
+                                  "7 of 10 requests reused an open connection")
@@ -0,0 +1,108 @@
+import gc
+
+import pytest
+
+from common import correlation
+from common.correlation import ACCOUNT, PROCESS, RANDOM, USER, CorrelationStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class User:
+    pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(correlation, "time", clock)
+    return clock
+
+
+def test_values_are_taken_round_robin_until_ttl(clock):
+    store = CorrelationStore(ttl=60)
+    assert store.take(None) is None
+
+    store.publish(None, [1, 2, 3])
+    assert [store.take(None) for _ in range(4)] == [1, 2, 3, 1]
+
+    clock.now += 60
+    assert store.take(None) is None
+
+
+def test_values_are_refreshed_after_refresh_every_uses(clock):
+    store = CorrelationStore(ttl=None, refresh_every=2)
+    store.publish(None, [1, 2])
+    assert [store.take(None), store.take(None)] == [1, 2]
+    assert store.take(None) is None
+
+    store.publish(None, [3])
+    assert store.take(None) == 3
+
+
+def test_only_one_caller_refreshes_stale_values(clock):
+    store = CorrelationStore(ttl=10, refresh_timeout=5)
+    store.publish(None, [1, 2])
+    clock.now += 10
+
+    # Первый вызов получает обновление, остальные до публикации - прежние значения
+    assert store.take(None) is None
+    assert [store.take(None), store.take(None)] == [1, 2]
+
+    store.publish(None, [7])
+    assert store.take(None) == 7
+
+
+def test_refresh_is_handed_over_after_refresh_timeout(clock):
+    store = CorrelationStore(ttl=10, refresh_timeout=5)
+    store.publish(None, [1])
+    clock.now += 10
+    assert store.take(None) is None
+
+    clock.now += 5
+    assert store.take(None) == 1
+    # Поручённый пользователь так и не опубликовал значения - обновление поручается следующему
+    clock.now += 0.1
+    assert store.take(None) is None
+    assert store.take(None) == 1
+
+
+def test_empty_values_are_not_taken(clock):
+    store = CorrelationStore()
+    store.publish(None, [])
+    assert store.take(None) is None
+
+
+def test_random_selection_takes_published_values(clock):
+    store = CorrelationStore(selection=RANDOM)
+    store.publish(None, [1, 2, 3])
+    assert {store.take(None) for _ in range(50)} <= {1, 2, 3}
+
+
+def test_scopes_share_values_by_key(clock):
+    first, second = User(), User()
+    assert CorrelationStore(scope=PROCESS).key(first, "alice") is None
+    assert CorrelationStore(scope=ACCOUNT).key(first, "alice") == "alice"
+
+    store = CorrelationStore(scope=USER)
+    store.publish(store.key(first, "alice"), [1])
+    assert store.take(store.key(first, "alice")) == 1
+    assert store.take(store.key(second, "alice")) is None
+
+    # Значения пользователя удаляются вместе с его объектом
+    del first
+    gc.collect()
+    assert len(store._values) == 0
+
+
+def test_unknown_scope_and_selection_are_rejected():
+    with pytest.raises(ValueError):
+        CorrelationStore(scope="cluster")
+    with pytest.raises(ValueError):
+        CorrelationStore(selection="lru")
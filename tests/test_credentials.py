@@ -0,0 +1,128 @@
+import gevent
+import pytest
+
+from common.credentials import CredentialFile, CredentialPool, CredentialsExhausted, FAIL, REUSE, WAIT
+
+RECORDS = [(f"user{i}", f"password{i}") for i in range(9)]
+
+
+def usernames(leases):
+    return [lease.username for lease in leases]
+
+
+def test_records_are_issued_in_order_and_returned_after_release():
+    pool = CredentialPool(RECORDS[:2], on_exhausted=FAIL)
+    first, second = pool.acquire(), pool.acquire()
+    assert usernames([first, second]) == ["user0", "user1"]
+
+    pool.release(first)
+    assert pool.acquire().username == "user0"
+
+
+def test_fail_policy_raises_when_pool_is_exhausted():
+    pool = CredentialPool(RECORDS[:1], on_exhausted=FAIL)
+    pool.acquire()
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+
+
+def test_wait_policy_gives_up_after_wait_timeout():
+    pool = CredentialPool(RECORDS[:1], on_exhausted=WAIT, wait_timeout=0.05)
+    pool.acquire()
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+
+
+def test_shard_issues_only_its_records():
+    pool = CredentialPool(RECORDS, on_exhausted=FAIL)
+    pool.set_shard(1, 3)
+    assert usernames([pool.acquire() for _ in range(3)]) == ["user1", "user4", "user7"]
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+
+
+def test_reshard_skips_leased_records_and_drops_foreign_ones_on_release():
+    pool = CredentialPool(RECORDS, on_exhausted=FAIL)
+    pool.set_shard(0, 2)
+    kept, foreign = pool.acquire(), pool.acquire()  # user0, user2
+    pool.set_shard(0, 3)
+
+    # user0 ещё в аренде, поэтому выдаются только user3 и user6
+    assert usernames([pool.acquire(), pool.acquire()]) == ["user3", "user6"]
+    # user2 не входит в новый шард и после возврата больше не выдаётся
+    pool.release(foreign)
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+    pool.release(kept)
+    assert pool.acquire().username == "user0"
+
+
+def test_reuse_policy_shares_issued_records_round_robin():
+    pool = CredentialPool(RECORDS[:2], on_exhausted=REUSE)
+    owned = [pool.acquire(), pool.acquire()]
+    shared = [pool.acquire() for _ in range(3)]
+    assert usernames(shared) == ["user0", "user1", "user0"]
+    assert all(lease.expires_at is None for lease in shared)
+
+    # Возврат общей аренды не освобождает запись её владельца
+    pool.release(shared[0])
+    pool.release(owned[1])
+    assert pool.acquire().username == "user1"
+
+
+def test_expired_lease_of_dead_owner_is_reclaimed():
+    pool = CredentialPool(RECORDS[:1], lease_ttl=0, on_exhausted=FAIL)
+    lease = gevent.spawn(pool.acquire).get()
+    assert lease.owner.dead
+    assert pool.acquire().username == "user0"
+
+
+def test_expired_lease_of_live_owner_is_renewed():
+    pool = CredentialPool(RECORDS[:1], lease_ttl=0, on_exhausted=FAIL)
+    pool.acquire()
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+
+
+def test_credential_file_reads_lines_lazily(tmp_path):
+    path = tmp_path / "credentials.txt"
+    path.write_text("user0,password0\nuser1,password1")
+    source = CredentialFile(str(path))
+    assert source[1] == ("user1", "password1")
+    assert source[0] == ("user0", "password0")
+    with pytest.raises(IndexError):
+        source[2]
+
+
+def test_records_held_by_other_workers_are_issued_after_exclusion_is_lifted():
+    pool = CredentialPool(RECORDS, on_exhausted=FAIL)
+    pool.set_shard(0, 3, excluded=[3])
+    assert usernames([pool.acquire(), pool.acquire()]) == ["user0", "user6"]
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+
+    pool.set_excluded([])
+    assert pool.acquire().username == "user3"
+
+
+def test_pending_shard_issues_only_returned_records_until_exclusions_arrive():
+    pool = CredentialPool(RECORDS, on_exhausted=WAIT, wait_timeout=0.05)
+    pool.set_shard(0, 2)
+    lease = pool.acquire()  # user0
+    pool.release(lease)
+    pool.set_shard(0, 2, excluded=None)
+
+    assert pool.acquire().username == "user0"
+    with pytest.raises(CredentialsExhausted):
+        pool.acquire()
+    pool.set_excluded([])
+    assert pool.acquire().username == "user2"
+
+
+def test_foreign_leases_are_leases_outside_the_current_shard():
+    pool = CredentialPool(RECORDS, on_exhausted=FAIL)
+    leases = [pool.acquire() for _ in range(4)]  # user0..user3
+    pool.set_shard(1, 2, excluded=None)
+    assert pool.foreign_leases() == [0, 2]
+    pool.release(leases[0])
+    assert pool.foreign_leases() == [2]
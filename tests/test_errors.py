@@ -0,0 +1,52 @@
+from common.errors import ErrorAggregator
+
+
+def test_same_fingerprint_gives_same_message_on_every_worker():
+    first, second = ErrorAggregator(), ErrorAggregator()
+
+    message = first.register(500, b'{"error": "timeout", "requestId": 12345}')
+    other = second.register(500, b'{"error": "timeout", "requestId": 67890}')
+
+    assert message == other
+    assert "12345" not in message
+    assert first.entries[message.split("[")[1].split("]")[0]].samples == ['{"error": "timeout", "requestId": 12345}']
+
+
+def test_secrets_are_removed_from_message_and_samples():
+    errors = ErrorAggregator()
+
+    message = errors.register(401, b'{"password": "hunter2", "user": "alice"}', secrets=("alice",))
+
+    entry = next(iter(errors.entries.values()))
+    assert "hunter2" not in message and "alice" not in message
+    assert "hunter2" not in entry.samples[0] and "alice" not in entry.samples[0]
+
+
+def test_master_merges_worker_reports():
+    master = ErrorAggregator(max_samples=2)
+    workers = [ErrorAggregator(), ErrorAggregator()]
+    for index, worker in enumerate(workers):
+        worker.register(502, f"bad gateway {index}".encode())
+        worker.register(502, f"bad gateway {index + 10}".encode())
+        master.merge(worker.take())
+
+    # Повторный отчёт без новых ошибок ничего не добавляет
+    master.merge(workers[0].take())
+    workers[1].register(502, b"bad gateway 42")
+    master.merge(workers[1].take())
+
+    [entry] = master.entries.values()
+    assert entry.count == 5
+    assert entry.samples == ["bad gateway 0", "bad gateway 10"]
+
+
+def test_master_keeps_table_bounded():
+    master = ErrorAggregator(max_entries=1)
+    for status_code in (500, 503):
+        worker = ErrorAggregator()
+        worker.register(status_code, b"error")
+        worker.register(status_code, b"error")
+        master.merge(worker.take())
+
+    assert len(master.entries) == 1
+    assert master.overflow == 2
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from common.extract import JsonPath, PathNotFound
+
+DOCUMENT = {"topicsStat": [{"topicId": 123, "topicType": {"id": 1, "name": "Видео"}},
+                           {"topicId": 456, "tags": ["a", "b"]}],
+            "total": 2}
+
+
+@pytest.mark.parametrize("path, steps", [
+    ("total", ["total"]),
+    ("topicsStat[1].topicId", ["topicsStat", 1, "topicId"]),
+    ("topicsStat[0].topicType.name", ["topicsStat", 0, "topicType", "name"]),
+    ("[0][1]", [0, 1]),
+])
+def test_path_is_split_into_keys_and_indexes(path, steps):
+    assert JsonPath(path).steps == steps
+
+
+@pytest.mark.parametrize("path", ["", ".total", "total.", "topicsStat[]", "topicsStat[-1]", "topicsStat[a]",
+                                  "topicsStat..topicId"])
+def test_invalid_path_is_rejected(path):
+    with pytest.raises(ValueError):
+        JsonPath(path)
+
+
+@pytest.mark.parametrize("path, value", [
+    ("total", 2),
+    ("topicsStat[0].topicId", 123),
+    ("topicsStat[1].topicId", 456),
+    ("topicsStat[0].topicType.name", "Видео"),
+    ("topicsStat[1].tags", ["a", "b"]),
+])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_value_matches_full_parse(path, value, indent):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent)
+    assert JsonPath(path).extract(text) == value
+    assert JsonPath(path).extract(text.encode()) == value
+
+
+@pytest.mark.parametrize("path", ["missing", "topicsStat[2].topicId", "total.value", "topicsStat.topicId",
+                                  "topicsStat[0].topicType[0]"])
+def test_missing_value_raises_path_not_found(path):
+    with pytest.raises(PathNotFound):
+        JsonPath(path).extract(json.dumps(DOCUMENT))
+
+
+@pytest.mark.parametrize("content", [None, "", b"", "not json", b'{"topicsStat" 1}'])
+def test_invalid_response_raises_value_error(content):
+    with pytest.raises(ValueError):
+        JsonPath("topicsStat").extract(content)
+
+
+@pytest.mark.parametrize("prefix_size", [1, 2, 3, 5, 7, 16, 1024])
+def test_bytes_are_decoded_in_chunks_without_cutting_values(prefix_size):
+    # Куски обрывают число и многобайтные символы в разных местах
+    content = json.dumps({"name": "Тема ü", "topicId": 1234567}, ensure_ascii=False).encode()
+    assert JsonPath("topicId", prefix_size=prefix_size).extract(content) == 1234567
+    assert JsonPath("name", prefix_size=prefix_size).extract(content) == "Тема ü"
+
+
+def test_document_after_value_is_not_checked():
+    # Задокументированные отличия от json.loads: обрезанный ответ и первое из повторяющихся значений
+    assert JsonPath("topicsStat[0].topicId").extract('{"topicsStat":[{"topicId":1') == 1
+    assert JsonPath("topicId").extract(b'{"topicId": 1, "topicId": 2}') == 1
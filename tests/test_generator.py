@@ -0,0 +1,41 @@
+import gevent
+
+from common.generator import CPU, GREENLETS, LOOP_LAG, GeneratorMonitor
+from common.stages import stage_tracker
+
+
+def test_stage_is_saturated_after_saturated_samples():
+    monitor = GeneratorMonitor(saturated_samples=3)
+    monitor.add_saturated({1: 2})
+    assert not monitor.is_saturated(1)
+
+    monitor.add_saturated({1: 1, 2: 1})
+    assert monitor.is_saturated(1)
+    assert not monitor.is_saturated(2)
+    assert monitor.saturated_stages() == [1]
+
+
+def test_master_keeps_maximum_of_worker_peaks():
+    master, worker = GeneratorMonitor(), GeneratorMonitor()
+    worker.add_peaks({0: {LOOP_LAG: 5, CPU: 40}})
+    worker.add_peaks({0: {LOOP_LAG: 3, CPU: 70}})
+    master.add_peaks(worker.take_peaks())
+    assert worker.take_peaks() == {}
+
+    master.add_peaks({0: {LOOP_LAG: 1, CPU: 90}})
+    assert master.peaks == {0: {LOOP_LAG: 5, CPU: 90}}
+    assert master.summary() == ["Load generator peaks at stage 0: loop lag, ms 5, cpu, % 90"]
+
+
+def test_run_records_peaks_of_current_stage():
+    monitor = GeneratorMonitor(interval=0.01, greenlets_interval=60)
+    stage_tracker.set(4)
+    watcher = gevent.spawn(monitor.run)
+    try:
+        gevent.sleep(0.05)
+    finally:
+        watcher.kill()
+        stage_tracker.set(0)
+
+    assert set(monitor.peaks) == {4}
+    assert monitor.peaks[4][GREENLETS] >= 2
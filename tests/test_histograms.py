@@ -0,0 +1,35 @@
+import pytest
+
+from common.histograms import SUB_BITS, LatencyHistogram, bucket_of, bucket_value
+
+VALUES = [*range(0, 5000), *(int(1.37 ** power) for power in range(27, 70)), 2 ** 40 - 1, 2 ** 40]
+
+
+def test_bucket_round_trip():
+    for value in VALUES:
+        bucket = bucket_of(value)
+        upper = bucket_value(bucket)
+
+        assert bucket_of(upper) == bucket, value
+        assert upper >= value
+        assert upper - value <= value / 2 ** (SUB_BITS - 1)
+        assert (upper - value) / max(value, 1) < 0.01
+
+
+def test_buckets_are_monotonic_and_contiguous():
+    previous = bucket_of(0)
+    for value in range(1, 1 << 16):
+        bucket = bucket_of(value)
+        assert bucket in (previous, previous + 1)
+        if bucket != previous:
+            assert bucket_value(previous) == value - 1
+        previous = bucket
+
+
+def test_percentile_error_is_below_one_percent():
+    histogram = LatencyHistogram()
+    for response_time in range(1, 10001):
+        histogram.record(response_time / 10)
+
+    assert histogram.percentile(0.5) == pytest.approx(500, rel=0.01)
+    assert histogram.percentile(0.99) == pytest.approx(990, rel=0.01)
@@ -0,0 +1,44 @@
+import subprocess
+
+from common.launcher import wait_master
+
+
+class Process:
+    """
+    Процесс, который завершается после заданного числа проверок poll(); exit_after=None - не завершается
+    """
+
+    def __init__(self, exit_after=None, returncode=0):
+        self.exit_after = exit_after
+        self.returncode = None
+        self._code = returncode
+
+    def poll(self):
+        if self.exit_after is not None:
+            if self.exit_after <= 0:
+                self.returncode = self._code
+            self.exit_after -= 1
+        return self.returncode
+
+    def wait(self, timeout=None):
+        # Процесс, который когда-нибудь завершится, успевает выйти за timeout
+        if self.exit_after is None:
+            raise subprocess.TimeoutExpired("locust", timeout)
+        self.returncode = self._code
+        return self.returncode
+
+
+def test_returns_none_when_master_exits_first():
+    master = Process(exit_after=2)
+    assert wait_master(master, [Process(), Process()], interval=0) is None
+
+
+def test_returns_worker_that_exited_before_master():
+    worker = Process(exit_after=1, returncode=1)
+    assert wait_master(Process(), [Process(), worker], interval=0, grace=0) is worker
+
+
+def test_workers_stopped_by_master_are_not_failures():
+    # Воркер вышел по команде мастера, и мастер завершился в пределах grace
+    master = Process(exit_after=3)
+    assert wait_master(master, [Process(exit_after=1)], interval=0) is None
@@ -0,0 +1,96 @@
+import csv
+import io
+import subprocess
+import sys
+
+from common.samples import COLUMNS, SampleSink, read_samples
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class HeldWriter:
+    """
+    Поток записи, который не пишет, пока не вызван run(): пачки остаются занятыми
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def spawn(self, write, *args):
+        self.jobs.append((write, args))
+
+    def run(self):
+        for write, args in self.jobs:
+            write(*args)
+        self.jobs.clear()
+
+    def join(self):
+        self.run()
+
+    def kill(self):
+        pass
+
+
+def fire(sink, count, name="GET /api", status_code=200, exception=None):
+    for i in range(count):
+        sink.on_request(name=name, response_time=10 + i, response_length=100, response=Response(status_code),
+                        exception=exception, start_time=1000.0 + i)
+
+
+def test_samples_round_trip_through_csv_export(tmp_path):
+    path = str(tmp_path / "samples.bin")
+    sink = SampleSink(path, batch_size=4)
+    sink.open(path)
+    fire(sink, 5)
+    fire(sink, 2, name="POST /api", status_code=500, exception=RuntimeError())
+    sink.close()
+
+    names, rows = read_samples(path)
+    assert names == ["GET /api", "POST /api"]
+    assert len(rows) == sink.recorded == 7
+
+    exported = subprocess.run([sys.executable, "-m", "common.samples", path], capture_output=True, text=True,
+                              check=True).stdout
+    table = list(csv.DictReader(io.StringIO(exported)))
+    assert tuple(table[0]) == COLUMNS
+    assert [row["name"] for row in table] == ["GET /api"] * 5 + ["POST /api"] * 2
+    assert [row["status"] for row in table[-3:]] == ["200", "500", "500"]
+    assert [row["failed"] for row in table[-3:]] == ["0", "1", "1"]
+    assert (float(table[0]["time"]), float(table[0]["latency"]), int(table[0]["size"])) == (1000.0, 10.0, 100)
+
+
+def test_samples_are_dropped_while_no_batch_is_free(tmp_path):
+    path = str(tmp_path / "samples.bin")
+    sink = SampleSink(path, batch_size=2, batches=2, flush_interval=60)
+    sink.open(path)
+    writer = sink._writer
+    sink._writer = HeldWriter()
+
+    # Две пачки ушли в запись и не вернулись: следующие запросы некуда положить
+    fire(sink, 7)
+    assert (sink.recorded, sink.dropped) == (4, 3)
+
+    sink._writer.run()
+    fire(sink, 1)
+    assert (sink.recorded, sink.dropped) == (5, 3)
+
+    sink._writer = writer
+    sink.close()
+    assert len(read_samples(path)[1]) == 5
+
+
+def test_sample_ratio_thins_samples_evenly(tmp_path):
+    path = str(tmp_path / "samples.bin")
+    sink = SampleSink(path, sample_ratio=0.25)
+    sink.open(path)
+    fire(sink, 100)
+    sink.close()
+
+    _, rows = read_samples(path)
+    assert sink.recorded == len(rows) == 25
+    # Записан каждый четвёртый запрос
+    latencies = [row[COLUMNS.index("latency")] for row in rows]
+    assert latencies == [13 + 4 * i for i in range(25)]
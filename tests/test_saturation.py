@@ -0,0 +1,51 @@
+import json
+from types import SimpleNamespace
+
+from locust.stats import RequestStats
+
+from common.saturation import AdaptiveStepLoadShape, StepMeasurement
+
+
+class StepShape(AdaptiveStepLoadShape):
+    summary_path = None
+
+
+def measure_step(log, user_count):
+    shape = StepShape()
+    shape.runner = SimpleNamespace(stats=RequestStats(), user_count=user_count)
+    shape.snapshot = shape.take_snapshot(0)
+    log(shape.runner.stats)
+    return shape.measure(10)
+
+
+def test_step_counts_only_http_requests():
+    def log(stats):
+        for _ in range(99):
+            stats.log_request("GET", "/api", 20, 0)
+        stats.log_request("POST", "/api", 40, 0)
+        stats.log_error("POST", "/api", "500")
+        # Пользователю не хватило логина: ошибка генератора, а не сервера
+        stats.log_request("CREDENTIALS", "exhausted", 30000, 0)
+        stats.log_error("CREDENTIALS", "exhausted", "No free credentials")
+
+    step = measure_step(log, user_count=10)
+    assert step.rps == 10
+    assert step.failure_ratio == 0.01
+    assert (step.p95, step.p99) == (20, 40)
+
+
+def test_step_records_running_and_target_users():
+    step = measure_step(lambda stats: stats.log_request("GET", "/api", 20, 0), user_count=51)
+    assert (step.users, step.target_users) == (51, StepShape.step_load)
+
+
+def test_summary_marks_steps_with_fewer_users_than_requested(tmp_path):
+    shape = StepShape()
+    shape.summary_path = tmp_path / "summary.json"
+    shape.next_step(StepMeasurement(users=10, target_users=10, rps=100, failure_ratio=0, p95=20, p99=40))
+    shape.next_step(StepMeasurement(users=15, target_users=20, rps=150, failure_ratio=0, p95=20, p99=40))
+    shape.finish("time limit reached")
+
+    summary = json.loads(shape.summary_path.read_text())
+    assert [step["users_limited"] for step in summary["steps"]] == [False, True]
+    assert summary["users_limited"]
@@ -0,0 +1,204 @@
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+from locust.event import Events
+from locust.runners import MasterRunner, STATE_MISSING, STATE_RUNNING, WorkerRunner
+
+from common.credentials import CredentialPool, CredentialsExhausted, FAIL
+from common.sharding import shard_credentials
+
+RECORDS = [(f"user{i}", f"password{i}") for i in range(12)]
+
+
+class FakeMaster(MasterRunner):
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.clients = {}
+        self.handlers = {}
+        self.greenlet = SimpleNamespace(spawn=lambda *args: None)
+
+    def __del__(self):
+        pass
+
+    def get_worker_index(self, client_id):
+        return list(self.clients).index(client_id)
+
+    def register_message(self, msg_type, listener, concurrent=False):
+        self.handlers[msg_type] = listener
+
+    def send_message(self, msg_type, data=None, client_id=None):
+        self.cluster.queue.append((self.cluster.workers[client_id], msg_type, data, "master"))
+
+
+class FakeWorker(WorkerRunner):
+    def __init__(self, cluster, client_id):
+        self.cluster = cluster
+        self.client_id = client_id
+        self.handlers = {}
+
+    def __del__(self):
+        pass
+
+    def register_message(self, msg_type, listener, concurrent=False):
+        self.handlers[msg_type] = listener
+
+    def send_message(self, msg_type, data=None, client_id=None):
+        self.cluster.queue.append((self.cluster.master, msg_type, data, self.client_id))
+
+
+class Cluster:
+    """
+    Мастер и воркеры в одном процессе: сообщения доставляются по очереди вызовом deliver()
+    """
+
+    def __init__(self, confirm_timeout=10):
+        self.queue = deque()
+        self.workers = {}
+        self.pools = {}
+        self.muted = set()  # воркеры, которые не отвечают мастеру
+        self.master = FakeMaster(self)
+        self.master_env = SimpleNamespace(runner=self.master, events=Events())
+        shard_credentials(self.master_env, CredentialPool(RECORDS), confirm_timeout=confirm_timeout)
+
+    def join(self, client_id):
+        worker = self.workers[client_id] = FakeWorker(self, client_id)
+        worker.env = SimpleNamespace(runner=worker, events=Events())
+        self.master.clients[client_id] = SimpleNamespace(id=client_id, state=STATE_RUNNING)
+        pool = self.pools[client_id] = CredentialPool(RECORDS, on_exhausted=FAIL, wait_timeout=0)
+        shard_credentials(worker.env, pool)
+
+    def leave(self, client_id):
+        self.master.clients[client_id].state = STATE_MISSING
+
+    def check_workers(self):
+        # То же, что делает мастер перед стартом теста и раз в check_interval
+        self.master_env.events.test_start.fire()
+
+    def report(self, client_id):
+        data = {}
+        self.workers[client_id].env.events.report_to_master.fire(client_id=client_id, data=data)
+        self.master_env.events.worker_report.fire(client_id=client_id, data=data)
+
+    def deliver(self):
+        while self.queue:
+            runner, msg_type, data, node_id = self.queue.popleft()
+            if node_id in self.muted:
+                continue
+            runner.handlers[msg_type](None, SimpleNamespace(data=data, node_id=node_id))
+
+
+def acquire_all(pool):
+    leases = []
+    while True:
+        try:
+            leases.append(pool.acquire())
+        except CredentialsExhausted:
+            return leases
+
+
+def indices(leases):
+    return sorted(lease.index for lease in leases)
+
+
+@pytest.fixture(autouse=True)
+def no_fixed_shard(monkeypatch):
+    monkeypatch.delenv("LOCUST_WORKER_INDEX", raising=False)
+    monkeypatch.delenv("LOCUST_WORKER_COUNT", raising=False)
+
+
+def test_joined_workers_get_disjoint_shards():
+    cluster = Cluster()
+    cluster.join("a")
+    cluster.join("b")
+    cluster.deliver()  # приветствия воркеров до начала теста ничего не меняют
+    cluster.check_workers()
+    cluster.deliver()
+
+    assert [(pool.shard_index, pool.shard_count) for pool in cluster.pools.values()] == [(0, 2), (1, 2)]
+    assert indices(acquire_all(cluster.pools["a"])) == [0, 2, 4, 6, 8, 10]
+    assert indices(acquire_all(cluster.pools["b"])) == [1, 3, 5, 7, 9, 11]
+
+
+def test_foreign_lease_is_forwarded_to_its_new_shard_owner():
+    cluster = Cluster()
+    cluster.join("a")
+    cluster.check_workers()
+    cluster.deliver()
+    held = [cluster.pools["a"].acquire() for _ in range(3)]  # записи 0, 1, 2
+
+    cluster.join("b")
+    cluster.check_workers()
+    cluster.deliver()
+
+    # Записи 1 держит пользователь воркера a, поэтому b выдаёт её только после возврата
+    assert (cluster.pools["b"].shard_index, cluster.pools["b"].shard_count) == (1, 2)
+    assert indices(acquire_all(cluster.pools["b"])) == [3, 5, 7, 9, 11]
+    assert indices(acquire_all(cluster.pools["a"])) == [4, 6, 8, 10]
+
+    cluster.pools["a"].release(held[1])
+    cluster.report("a")
+    cluster.deliver()
+    assert indices(acquire_all(cluster.pools["b"])) == [1]
+
+
+def test_shard_waits_for_leases_until_confirm_timeout():
+    cluster = Cluster(confirm_timeout=0)
+    cluster.join("a")
+    cluster.check_workers()
+    cluster.deliver()
+    cluster.pools["a"].acquire()
+
+    cluster.join("b")
+    cluster.muted.add("a")
+    cluster.check_workers()
+    cluster.deliver()
+
+    # Воркер a не прислал свои записи: b не выдаёт новые записи шарда
+    assert cluster.pools["b"]._pending
+    assert acquire_all(cluster.pools["b"]) == []
+
+    cluster.check_workers()  # confirm_timeout истёк
+    cluster.deliver()
+    assert not cluster.pools["b"]._pending
+    assert indices(acquire_all(cluster.pools["b"])) == [1, 3, 5, 7, 9, 11]
+
+
+def test_shards_are_rebuilt_when_worker_leaves():
+    cluster = Cluster()
+    for client_id in ("a", "b", "c"):
+        cluster.join(client_id)
+    cluster.check_workers()
+    cluster.deliver()
+    held = cluster.pools["c"].acquire()  # запись 2
+
+    cluster.leave("b")
+    cluster.check_workers()
+    cluster.deliver()
+
+    assert [(pool.shard_index, pool.shard_count) for pool in (cluster.pools["a"], cluster.pools["c"])] == \
+        [(0, 2), (1, 2)]
+    # Запись 2 теперь в шарде a, но её ещё держит пользователь воркера c
+    assert indices(acquire_all(cluster.pools["a"])) == [0, 4, 6, 8, 10]
+
+    cluster.pools["c"].release(held)
+    cluster.report("c")
+    cluster.deliver()
+    assert indices(acquire_all(cluster.pools["a"])) == [2]
+
+
+def test_late_worker_gets_shard_of_current_epoch():
+    cluster = Cluster()
+    cluster.join("a")
+    cluster.join("b")
+    cluster.queue.pop()  # приветствие b придёт позже
+    cluster.check_workers()
+    # Воркер b подключился раньше, чем подписался на шарды, и пропустил свой
+    cluster.queue = deque(item for item in cluster.queue if item[0] is not cluster.workers["b"])
+    cluster.deliver()
+    assert (cluster.pools["b"].shard_index, cluster.pools["b"].shard_count) == (0, 1)
+
+    cluster.workers["b"].send_message("credentials_leases", {"epoch": None, "leases": []})
+    cluster.deliver()
+    assert (cluster.pools["b"].shard_index, cluster.pools["b"].shard_count) == (1, 2)
+    assert indices(acquire_all(cluster.pools["b"])) == [1, 3, 5, 7, 9, 11]
@@ -0,0 +1,72 @@
+import pytest
+
+from common.timeline import Timeline, TimelineShape
+
+
+def stages_at(timeline, times):
+    return [timeline.segments[timeline.index(run_time)] for run_time in times]
+
+
+def test_ramp_points_belong_to_one_stage():
+    timeline = Timeline.compile([
+        {"type": "hold", "duration": 10, "users": 5},
+        {"type": "ramp", "duration": 10, "to": 15},
+        {"type": "hold", "duration": 10, "users": 15},
+    ])
+
+    assert len(timeline) > 3
+    assert stages_at(timeline, (0, 9, 10, 15, 19, 20, 29)) == [0, 0, 1, 1, 1, 2, 2]
+
+
+def test_repeated_and_equal_segments_are_separate_stages():
+    timeline = Timeline.compile([
+        {"type": "hold", "duration": 10, "users": 5},
+        {"type": "hold", "duration": 10, "users": 5},
+        {"type": "repeat", "times": 2, "segments": [{"type": "spike", "duration": 5, "users": 20}]},
+    ])
+
+    assert stages_at(timeline, (0, 10, 20, 25, 29)) == [0, 1, 2, 3, 3]
+    assert timeline.at(29) == (20, 10)
+
+
+def test_shape_reports_segment_as_stage():
+    class Shape(TimelineShape):
+        stages = [{"duration": 10, "users": 5, "spawn_rate": 1}, {"duration": 20, "users": 10, "spawn_rate": 2}]
+
+    shape = Shape()
+    shape.get_run_time = lambda: 15
+    assert shape.tick() == (10, 2)
+    assert shape.stage == 1
+
+    shape.get_run_time = lambda: 20
+    assert shape.tick() is None
+
+
+@pytest.mark.parametrize("segments, message", [
+    ([{"type": "hold", "duration": 10, "users": 12.5}], r"Segment 1 \(hold\): users must be a non-negative whole number"),
+    ([{"type": "hold", "duration": 10, "users": 5},
+      {"type": "repeat", "times": 2, "segments": [{"type": "spike", "duration": 5, "users": -1}]}],
+     r"Segment 2\.1 \(spike\): users must be"),
+    ([{"type": "repeat", "times": 1.5, "segments": []}], r"Segment 1 \(repeat\): times must be"),
+    ([{"type": "ramp", "duration": 10}], r"Segment 1 \(ramp\): missing fields \['to'\]"),
+    ([{"type": "plateau", "duration": 10}], "Segment 1: unknown type 'plateau'"),
+])
+def test_invalid_segments_are_reported_with_their_number(segments, message):
+    with pytest.raises(ValueError, match=message):
+        Timeline.compile(segments)
+
+
+def test_whole_float_users_and_sine_bounds_are_accepted():
+    timeline = Timeline.compile([
+        {"type": "hold", "duration": 10, "users": 12.0},
+        {"type": "sine", "duration": 10, "min": 1.5, "max": 20.5},
+    ])
+    assert timeline.at(0) == (12, 10)
+    assert all(isinstance(users, int) for users in timeline.users)
+
+
+def test_csv_profile_rejects_repeat(tmp_path):
+    path = tmp_path / "profile.csv"
+    path.write_text("type,duration,users,times\nhold,10,5,\nrepeat,,,2\n")
+    with pytest.raises(ValueError, match="Segment 2: repeat is not supported in CSV profiles"):
+        Timeline.load(str(path))
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from common.tokens import TokenCache
+
+
+class Login:
+    """
+    Логин, который запоминает вызовы и может задержать ответ до release()
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.completed = 0
+        self.released = threading.Event()
+        self.released.set()
+
+    def hold(self):
+        self.released.clear()
+
+    def release(self):
+        self.released.set()
+
+    def __call__(self, username, password):
+        self.calls.append((username, password))
+        self.released.wait()
+        self.completed += 1
+        return f"token{self.completed}"
+
+
+def wait_for(condition, timeout=1):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert condition()
+
+
+def test_token_is_shared_until_refresh():
+    cache, login = TokenCache(ttl=60, refresh_ahead=1), Login()
+    assert cache.get("user0", "password0", login) == "token1"
+    assert cache.get("user0", "password0", login) == "token1"
+    assert login.calls == [("user0", "password0")]
+
+
+def test_background_refresh_uses_credentials_captured_at_start():
+    cache, login = TokenCache(ttl=60, refresh_ahead=60), Login()
+    cache.get("user0", "password0", login)
+
+    login.hold()
+    assert cache.get("user0", "password0", login) == "token1"  # старый токен, обновление в фоне
+    login.release()
+    wait_for(lambda: login.completed == 2)
+    assert login.calls == [("user0", "password0")] * 2
+
+
+def test_expired_token_waits_for_running_refresh_instead_of_second_login():
+    cache, login = TokenCache(ttl=0.05, refresh_ahead=0.04), Login()
+    cache.get("user0", "password0", login)
+    time.sleep(0.02)
+
+    login.hold()
+    cache.get("user0", "password0", login)  # запускает фоновое обновление
+    wait_for(lambda: len(login.calls) == 2)
+    time.sleep(0.04)  # старый токен истёк, обновление ещё идёт
+
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(cache.get("user0", "password0", login)))
+    waiter.start()
+    time.sleep(0.02)
+    login.release()
+    waiter.join(1)
+    assert result == ["token2"]
+    assert len(login.calls) == 2